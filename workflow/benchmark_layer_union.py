@@ -0,0 +1,101 @@
+# Benchmark for 2D union of planar metal layers in gds2palace
+#
+# Runs the bundled palace_*.py examples with the default path (extrude each polygon, then 3D fuse of all volumes
+# on each planar metal layer) and with settings['union_2D']=True (2D union of each planar metal layer on the
+# polygon store, extrude once per connected region, no 3D fuse). For each run the complete model is created and
+# meshed with mesh.generate(3), then physical groups are compared: for each group name the total area/volume must be
+# the same. Polygon numbers in group names (e.g. Metal1_2_xy) are ignored, because the 3D fuse can merge disjoint
+# regions on a layer into one volume, while 2D union creates one volume per connected region.
+
+import os
+import re
+import math
+import sys
+import time
+import runpy
+import gmsh
+
+# we expect gds2palace in the same directory as this file
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), 'gds2palace')))
+from gds2palace import *
+
+
+def get_physical_groups ():
+    # physical groups of current model, key is group name without polygon number, value is (dim, total area/volume)
+    # the 3D fuse can merge disjoint regions on a layer into one volume, so polygon numbers and entity count can differ
+    groups = {}
+    for dim, tag in gmsh.model.getPhysicalGroups():
+        name = gmsh.model.getPhysicalName(dim, tag)
+        key = re.sub(r'_\d+(_xy|_z)$', r'\1', name)
+        size = sum(gmsh.model.occ.getMass(dim, entity) for entity in gmsh.model.getEntitiesForPhysicalGroup(dim, tag))
+        groups[key] = (dim, groups.get(key, (dim, 0))[1] + size)
+    return groups
+
+
+def same_physical_groups (groups1, groups2, tolerance=1e-6):
+    # same group names, dimension and total area/volume for each name
+    if groups1.keys() != groups2.keys():
+        return False
+    return all((groups1[key][0] == groups2[key][0]) and math.isclose(groups1[key][1], groups2[key][1], rel_tol=tolerance)
+               for key in groups1)
+
+
+def run_example (script, union_2D):
+    # run example script with union_2D setting, return time for geometry (until mesh), time for mesh and physical groups
+    result = {'error': None}
+    create_palace = simulation_setup.create_palace
+    generate = gmsh.model.mesh.generate
+
+    def create_palace_with_settings (excite_ports, settings):
+        settings['union_2D'] = union_2D
+        settings['no_gui'] = True
+        result['t_start'] = time.perf_counter()
+        return create_palace(excite_ports, settings)
+
+    def generate_and_evaluate (dim=3):
+        t_start = time.perf_counter()
+        result['t_geometry'] = t_start - result['t_start']
+        generate(dim)
+        result['t_mesh'] = time.perf_counter() - t_start
+        result['groups'] = get_physical_groups()
+
+    # example scripts can change working directory when starting the simulation
+    cwd = os.getcwd()
+    simulation_setup.create_palace = create_palace_with_settings
+    gmsh.model.mesh.generate = generate_and_evaluate
+    try:
+        runpy.run_path(script, run_name='__main__')
+    except Exception as e:
+        result['error'] = str(e)
+    finally:
+        simulation_setup.create_palace = create_palace
+        gmsh.model.mesh.generate = generate
+        if gmsh.isInitialized():
+            gmsh.finalize()
+        os.chdir(cwd)
+    if ('groups' not in result) and (result['error'] is None):
+        result['error'] = 'mesh not created'
+    return result
+
+
+script_path = utilities.get_script_path(__file__)
+
+examples = ['palace_L2n0.py', 'palace_line_viaport.py', 'palace_rfcmim.py', 'palace_ind_frame.py',
+            'palace_pcb_lowpass.py', 'palace_core.py', 'palace_butlermatrix.py']
+
+for example in examples:
+    results = {}
+    for union_2D in (False, True):
+        results[union_2D] = run_example(os.path.join(script_path, example), union_2D)
+
+    print(f'{example}:')
+    for union_2D, label in ((False, '3D fuse: '), (True, '2D union:')):
+        result = results[union_2D]
+        if result['error'] is not None:
+            print(f'  {label} FAILED: {result["error"]}')
+        else:
+            print(f'  {label} geometry {result["t_geometry"]:.3f} s, mesh {result["t_mesh"]:.3f} s')
+    if (results[False]['error'] is None) and (results[True]['error'] is None):
+        speedup = results[False]['t_geometry'] / max(results[True]['t_geometry'], 1e-9)
+        same = same_physical_groups(results[False]['groups'], results[True]['groups'])
+        print(f'  geometry speedup {speedup:.1f}, same physical groups: {same}')
@@ -0,0 +1,72 @@
+# Benchmark for rectangle based geometry creation in gds2palace
+#
+# Compares add_metals() with the default path (addPoint/addLine/addCurveLoop/addPlaneSurface/extrude
+# for each polygon, one fuse per layer) with use_rectangles=True (polygons that are a single rectangle
+# created with addBox/addRectangle) on the bundled GDSII examples.
+# Time includes OCC construction and fuse, the mesh is not created.
+
+import os
+import sys
+import time
+import numpy as np
+import gmsh
+
+# we expect gds2palace in the same directory as this file
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), 'gds2palace')))
+from gds2palace import *
+
+
+def run_add_metals (allpolygons, metals_list, use_rectangles):
+    # build metal geometry in a new gmsh model, return time and number of entities
+    gmsh.initialize()
+    gmsh.option.setNumber("General.Terminal", 0)
+    gmsh.model.add("benchmark")
+    t_start = time.perf_counter()
+    simulation_setup.add_metals(allpolygons, metals_list, use_rectangles=use_rectangles)
+    t_build = time.perf_counter() - t_start
+    num_volumes = len(gmsh.model.getEntities(3))
+    num_surfaces = len(gmsh.model.getEntities(2))
+    num_curves = len(gmsh.model.getEntities(1))
+    gmsh.finalize()
+    return t_build, num_volumes, num_surfaces, num_curves
+
+
+def rectangle_statistics (allpolygons, metals_list):
+    # number of metal polygons and polygons that are a single rectangle
+    store = allpolygons.store
+    is_rectangle = gds_reader.rectangle_mask(store.coords, np.diff(store.offsets))
+    num_polygons = num_rectangles = 0
+    for layernum in store.get_layers():
+        if metals_list.getbylayernumber(layernum) is None:
+            continue
+        layer_slice = store.get_layer_slice(layernum)
+        num_polygons = num_polygons + layer_slice.stop - layer_slice.start
+        num_rectangles = num_rectangles + int(np.sum(is_rectangle[layer_slice]))
+    return num_polygons, num_rectangles
+
+
+script_path = utilities.get_script_path(__file__)
+
+# GDSII file, stackup, preprocess, merge_polygon_size as in the palace_*.py examples
+examples = [
+    ('50_ghz_mpa_core_no_BJT.gds',         'SG13G2_100um.xml', False, 1.2),
+    ('BM_Ardavan_Rahimian_with_ports.gds', 'SG13G2_nosub.xml', True,  0),
+    ('L_2n0_twoport.gds',                  'SG13G2_200um.xml', True,  2),
+    ('ind_frame_with_ports.gds',           'SG13G2_200um.xml', False, 0),
+    ('rfcmim_30x15x10_full.gds',           'SG13G2_200um.xml', True,  2),
+    ('line_simple_viaport.gds',            'SG13G2_nosub.xml', False, 0),
+    ('pcb_lowpass.gds',                    'pcb_ro4003.xml',   True,  0),
+]
+
+for gds_filename, XML_filename, preprocess_gds, merge_polygon_size in examples:
+    materials_list, dielectrics_list, metals_list = stackup_reader.read_substrate(os.path.join(script_path, XML_filename))
+    layernumbers = metals_list.getlayernumbers()
+    allpolygons = gds_reader.read_gds(os.path.join(script_path, gds_filename), layernumbers, purposelist=[0], metals_list=metals_list,
+                                      preprocess=preprocess_gds, merge_polygon_size=merge_polygon_size)
+
+    num_polygons, num_rectangles = rectangle_statistics(allpolygons, metals_list)
+    t_default, *entities_default = run_add_metals(allpolygons, metals_list, False)
+    t_rectangles, *entities_rectangles = run_add_metals(allpolygons, metals_list, True)
+    print(f'{gds_filename}: {num_polygons} polygons, {num_rectangles} rectangles')
+    print(f'  default:        {t_default:.3f} s, volumes/surfaces/curves {entities_default}')
+    print(f'  use_rectangles: {t_rectangles:.3f} s, volumes/surfaces/curves {entities_rectangles}, speedup {t_default/max(t_rectangles,1e-9):.1f}')
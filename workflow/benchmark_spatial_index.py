@@ -0,0 +1,64 @@
+# Benchmark for spatial index on polygon store in gds2palace
+#
+# Compares polygon_store.query_boxes() (uniform grid index per layer) with a linear scan
+# over all polygon bounding boxes, for 10k and 1M polygons on one layer.
+
+import os
+import sys
+import time
+import numpy as np
+
+# we expect gds2palace in the same directory as this file
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), 'gds2palace')))
+from gds2palace import *
+
+
+def random_rectangle_store (num_polygons, layernum=8, seed=1):
+    # rectangles with random size on a square area, about the density of a metal layer
+    rng = np.random.default_rng(seed)
+    span = np.sqrt(num_polygons) * 10
+    xy = rng.uniform(0, span, (num_polygons,2))
+    size = rng.uniform(0.5, 5, (num_polygons,2))
+    dx = np.column_stack((size[:,0], np.zeros(num_polygons)))
+    dy = np.column_stack((np.zeros(num_polygons), size[:,1]))
+    rectangles = np.stack((xy, xy + dx, xy + size, xy + dy), axis=1)
+    store = gds_reader.polygon_store()
+    store.append_polygons(rectangles.reshape(-1,2), np.full(num_polygons, 4), layernum)
+    return store, span
+
+
+def linear_scan (store, layernum, boxes):
+    # reference: check all bounding boxes of the layer for each query box
+    layer_slice = store.get_layer_slice(layernum)
+    bbox = store.bbox[layer_slice]
+    box_index = []
+    polygon_index = []
+    for n, (xmin, xmax, ymin, ymax) in enumerate(boxes):
+        found = np.flatnonzero((bbox[:,0] <= xmax) & (bbox[:,1] >= xmin) & (bbox[:,2] <= ymax) & (bbox[:,3] >= ymin))
+        box_index.append(np.full(len(found), n))
+        polygon_index.append(found + layer_slice.start)
+    return np.concatenate(box_index), np.concatenate(polygon_index)
+
+
+num_queries = 1000
+for num_polygons in (10000, 1000000):
+    store, span = random_rectangle_store(num_polygons)
+    rng = np.random.default_rng(2)
+    corner = rng.uniform(0, span, (num_queries,2))
+    boxes = np.column_stack((corner[:,0], corner[:,0] + 10, corner[:,1], corner[:,1] + 10))
+
+    t_start = time.perf_counter()
+    store.get_spatial_index(8)
+    t_build = time.perf_counter() - t_start
+
+    t_start = time.perf_counter()
+    index_result = store.query_boxes(8, boxes)
+    t_index = time.perf_counter() - t_start
+
+    t_start = time.perf_counter()
+    scan_result = linear_scan(store, 8, boxes)
+    t_scan = time.perf_counter() - t_start
+
+    same = all(np.array_equal(a, b) for a, b in zip(index_result, scan_result))
+    print(f'{num_polygons} polygons, {num_queries} box queries: index build {t_build:.3f} s, index query {t_index:.4f} s, '
+          f'linear scan {t_scan:.3f} s, speedup {t_scan/max(t_index,1e-9):.0f}, same result: {same}')
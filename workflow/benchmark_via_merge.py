@@ -0,0 +1,72 @@
+# Benchmark for via array merging engines in gds2palace
+#
+# Compares merge_via_array() engine='boolean' (offset/boolean/offset on all vias)
+# with engine='grid' (spatial hash clustering of rectangular vias) on the via layers
+# of rfcmim_30x15x10_full.gds, on a synthetic layer with 100k vias and on a via array
+# where the gap is exactly the merge limit (oversized vias touch, both engines must merge them).
+
+import os
+import sys
+import time
+import numpy as np
+import gdspy
+
+# we expect gds2palace in the same directory as this file
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), 'gds2palace')))
+from gds2palace import *
+
+
+def normalized (polygons):
+    # sorted list of rounded vertex tuples, independent of polygon and start vertex order
+    result = []
+    for polypoints in polygons:
+        points = [tuple(point) for point in np.round(np.asarray(polypoints), 6)]
+        start = points.index(min(points))
+        result.append(tuple(points[start:] + points[:start]))
+    return sorted(result)
+
+
+def run_engines (name, polygons, merge_polygon_size):
+    timing = {}
+    results = {}
+    for engine in ('boolean', 'grid'):
+        t_start = time.perf_counter()
+        results[engine] = gds_reader.merge_via_array(polygons, merge_polygon_size, engine)
+        timing[engine] = time.perf_counter() - t_start
+    same = normalized(results['boolean']) == normalized(results['grid'])
+    speedup = timing['boolean'] / max(timing['grid'], 1e-9)
+    print(f'{name}: {len(polygons)} vias -> {len(results["grid"])} polygons, boolean {timing["boolean"]:.3f} s, '
+          f'grid {timing["grid"]:.3f} s, speedup {speedup:.1f}, same result: {same}')
+
+
+def synthetic_via_layer (num_arrays=1000, rows=10, columns=10, via_size=0.19, via_pitch=0.41, array_pitch=8):
+    # regular via arrays on a larger grid, num_arrays * rows * columns vias in total
+    via = np.array([[0, 0], [via_size, 0], [via_size, via_size], [0, via_size]])
+    ii, jj = np.meshgrid(np.arange(columns), np.arange(rows), indexing='ij')
+    array_offsets = np.column_stack((ii.ravel(), jj.ravel())) * via_pitch
+    arrays_per_row = int(np.ceil(np.sqrt(num_arrays)))
+    polygons = []
+    for n in range(num_arrays):
+        origin = np.array([n % arrays_per_row, n // arrays_per_row]) * array_pitch
+        polygons.extend(via + origin + offset for offset in array_offsets)
+    return polygons
+
+
+script_path = utilities.get_script_path(__file__)
+merge_polygon_size = 1.2
+
+# via layers from bundled GDSII file, flattened as in read_gds()
+materials_list, dielectrics_list, metals_list = stackup_reader.read_substrate(os.path.join(script_path, 'SG13G2_200um.xml'))
+gds_filename = os.path.join(script_path, 'rfcmim_30x15x10_full.gds')
+cell = gdspy.GdsLibrary(infile=gds_filename).top_level()[0]
+cell.flatten()
+polygons_by_spec = cell.get_polygons(by_spec=True, depth=0)
+for metal in metals_list.metals:
+    if metal.is_via and (int(metal.layernum), 0) in polygons_by_spec:
+        run_engines(f'{os.path.basename(gds_filename)} layer {metal.layernum} ({metal.name})', polygons_by_spec[(int(metal.layernum), 0)], merge_polygon_size)
+
+# synthetic layer with 100k vias
+run_engines('synthetic layer', synthetic_via_layer(), merge_polygon_size)
+
+# gap equal to merge limit: 0.38 vias at 1.0 pitch, gap 0.62 = 2 * get_via_merge_offset(0.6)
+run_engines('gap at merge limit', synthetic_via_layer(num_arrays=4, rows=4, columns=4, via_size=0.38, via_pitch=1.0), 0.6)
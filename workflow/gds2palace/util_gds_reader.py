@@ -18,11 +18,19 @@
 
 # Extract objects from layers in GDSII file
 
-__version__ = "1.0.2"
+__version__ = "1.1.0"
 
 import gdspy
 import numpy as np
 import os
+import time
+import json
+import hashlib
+import concurrent.futures
+from multiprocessing import shared_memory
+
+from . import util_utilities as utilities
+from . import util_gds_stream as gds_stream
 
 # check that we have gdspy version 1.6.x or later
 # gdspy 1.4.2 is known for issues with our geometries
@@ -177,6 +185,15 @@ class gds_polygon:
     self.pts_x = np.append(self.pts_x, x)
     self.pts_y = np.append(self.pts_y, y)
 
+  def add_vertices (self, xy):
+    """Add many points (vertices) to the polygon at once, much faster than calling add_vertex for each point
+    Args:
+        xy (array of [x,y]): polygon points
+    """
+    xy = np.asarray(xy, dtype=float).reshape(-1,2)
+    self.pts_x = np.concatenate((self.pts_x, xy[:,0]))
+    self.pts_y = np.concatenate((self.pts_y, xy[:,1]))
+
   def process_pts (self):
     """Process and update all points, update bounding box data fields
     """
@@ -196,17 +213,769 @@ class gds_polygon:
     return mystr
 
 
+class spatial_grid_index:
+  """
+    Spatial index for polygon bounding boxes of one layer: uniform grid, bulk loaded from all bounding boxes at once.
+    Each grid cell stores the polygons whose bounding box overlaps the cell. Polygons that cover very many grid cells
+    are kept in a separate list and checked directly. Queries are vectorized over many boxes or points.
+  """
+
+  max_cells_per_polygon = 64
+
+  def __init__ (self, bbox, first_index=0):
+    """Build index
+
+    Args:
+        bbox (array of [xmin, xmax, ymin, ymax]): bounding box for each polygon, same order as in polygon_store
+        first_index (int, optional): polygon index of first bounding box, returned indices are bbox index + first_index. Defaults to 0.
+    """
+    self.bbox = np.asarray(bbox, dtype=float).reshape(-1,4)
+    self.first_index = first_index
+    num = len(self.bbox)
+    if num == 0:
+      self.num_x = 0
+      self.num_y = 0
+      self.cell_start = np.zeros(1, dtype=np.int64)
+      self.cell_items = np.zeros(0, dtype=np.int64)
+      self.large_items = np.zeros(0, dtype=np.int64)
+      return
+
+    # grid origin and cell size: about one polygon per cell, but not smaller than typical polygon size
+    self.x0 = np.min(self.bbox[:,0])
+    self.y0 = np.min(self.bbox[:,2])
+    width  = np.max(self.bbox[:,1]) - self.x0
+    height = np.max(self.bbox[:,3]) - self.y0
+    polygon_size = np.median(np.maximum(self.bbox[:,1] - self.bbox[:,0], self.bbox[:,3] - self.bbox[:,2]))
+    self.cell_size = max(np.sqrt(width * height / num), polygon_size, 1e-9)
+    self.num_x = int(width  // self.cell_size) + 1
+    self.num_y = int(height // self.cell_size) + 1
+
+    ix0, ix1, iy0, iy1 = self.get_cell_range(self.bbox)
+    cells_x = ix1 - ix0 + 1
+    cells_y = iy1 - iy0 + 1
+    num_cells = cells_x * cells_y
+    large = num_cells > self.max_cells_per_polygon
+    self.large_items = np.flatnonzero(large)
+
+    # all (cell, polygon) entries, sorted by cell
+    small = np.flatnonzero(~large)
+    repeat = num_cells[small]
+    item = np.repeat(small, repeat)
+    local = np.arange(np.sum(repeat)) - np.repeat(np.cumsum(repeat) - repeat, repeat)
+    cell = (ix0[item] + local % cells_x[item]) * self.num_y + iy0[item] + local // cells_x[item]
+    order = np.argsort(cell, kind='stable')
+    self.cell_items = item[order]
+    self.cell_start = np.concatenate(([0], np.cumsum(np.bincount(cell, minlength=self.num_x*self.num_y))))
+
+
+  def get_cell_range (self, boxes):
+    """Grid cell index range for boxes, clipped to grid
+
+    Args:
+        boxes (array of [xmin, xmax, ymin, ymax]): boxes
+
+    Returns:
+        ix0, ix1, iy0, iy1 (arrays of int): first and last cell index in x and y
+    """
+    ix0 = np.clip(np.floor((boxes[:,0] - self.x0) / self.cell_size), 0, self.num_x-1).astype(np.int64)
+    ix1 = np.clip(np.floor((boxes[:,1] - self.x0) / self.cell_size), 0, self.num_x-1).astype(np.int64)
+    iy0 = np.clip(np.floor((boxes[:,2] - self.y0) / self.cell_size), 0, self.num_y-1).astype(np.int64)
+    iy1 = np.clip(np.floor((boxes[:,3] - self.y0) / self.cell_size), 0, self.num_y-1).astype(np.int64)
+    return ix0, ix1, iy0, iy1
+
+
+  def query_boxes (self, boxes, distance=0):
+    """Find polygons with bounding box overlapping (or touching) query boxes
+
+    Args:
+        boxes (array of [xmin, xmax, ymin, ymax]): query boxes
+        distance (float, optional): query boxes are enlarged by this value. Defaults to 0.
+
+    Returns:
+        box_index (array of int), polygon_index (array of int): all pairs of query box and polygon, sorted by box index
+    """
+    boxes = np.asarray(boxes, dtype=float).reshape(-1,4) + np.array([-distance, distance, -distance, distance])
+    if (len(self.bbox) == 0) or (len(boxes) == 0):
+      return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+
+    # boxes outside the grid have no candidates
+    valid = np.flatnonzero((boxes[:,1] >= self.x0) & (boxes[:,0] <= self.x0 + self.num_x * self.cell_size) &
+                           (boxes[:,3] >= self.y0) & (boxes[:,2] <= self.y0 + self.num_y * self.cell_size))
+    ix0, ix1, iy0, iy1 = self.get_cell_range(boxes[valid])
+    cells_x = ix1 - ix0 + 1
+    num_cells = cells_x * (iy1 - iy0 + 1)
+
+    # all grid cells for each query box
+    query = np.repeat(np.arange(len(valid)), num_cells)
+    local = np.arange(np.sum(num_cells)) - np.repeat(np.cumsum(num_cells) - num_cells, num_cells)
+    cell = (ix0[query] + local % cells_x[query]) * self.num_y + iy0[query] + local // cells_x[query]
+
+    # all polygons in these grid cells, plus large polygons
+    repeat = self.cell_start[cell+1] - self.cell_start[cell]
+    pair_query = np.repeat(query, repeat)
+    local = np.arange(np.sum(repeat)) - np.repeat(np.cumsum(repeat) - repeat, repeat)
+    pair_item = self.cell_items[np.repeat(self.cell_start[cell], repeat) + local]
+    if len(self.large_items) > 0:
+      pair_query = np.concatenate((pair_query, np.repeat(np.arange(len(valid)), len(self.large_items))))
+      pair_item = np.concatenate((pair_item, np.tile(self.large_items, len(valid))))
+
+    # exact bounding box check, remove duplicates from polygons in more than one cell
+    box = boxes[valid][pair_query]
+    item_bbox = self.bbox[pair_item]
+    overlap = (item_bbox[:,0] <= box[:,1]) & (item_bbox[:,1] >= box[:,0]) & (item_bbox[:,2] <= box[:,3]) & (item_bbox[:,3] >= box[:,2])
+    pair_key = np.unique(pair_query[overlap] * len(self.bbox) + pair_item[overlap])
+    return valid[pair_key // len(self.bbox)], pair_key % len(self.bbox) + self.first_index
+
+
+  def query_points (self, points, distance=0):
+    """Find polygons with bounding box that contains query points, or is within distance from points
+
+    Args:
+        points (array of [x,y]): query points
+        distance (float, optional): search distance. Defaults to 0.
+
+    Returns:
+        point_index (array of int), polygon_index (array of int): all pairs of point and polygon, sorted by point index
+    """
+    points = np.asarray(points, dtype=float).reshape(-1,2)
+    return self.query_boxes(np.column_stack((points[:,0], points[:,0], points[:,1], points[:,1])), distance)
+
+
+
+class polygon_store:
+  """
+    Columnar (array based) storage for all polygons of a model.
+    Instead of one Python object per polygon, all vertices are stored in one flat coordinate array.
+    Polygon i owns the vertices coords[offsets[i]:offsets[i+1]], its layer number is layers[i].
+    Polygons are kept sorted by layer number, so that all polygons of one layer are a contiguous slice.
+    New data is collected in chunks first and only combined into the flat arrays when data is accessed.
+  """
+
+  def __init__ (self):
+    """Initialize empty store
+    """
+    self._coords   = np.zeros((0,2))                   # all vertices, shape (numvertices, 2)
+    self._offsets  = np.zeros(1, dtype=np.int64)        # vertex offset per polygon, length numpolygons+1
+    self._layers   = np.zeros(0, dtype=np.int64)        # layer number per polygon
+    self._is_port  = np.zeros(0, dtype=bool)            # port flag per polygon
+    self._is_via   = np.zeros(0, dtype=bool)            # via flag per polygon
+    self._bbox     = np.zeros((0,4))                    # xmin, xmax, ymin, ymax per polygon
+    self._layer_start = {}                              # per-layer slices, key is layer number
+    self._pending  = []                                 # chunks that are not yet combined into flat arrays
+    self._has_duplicates = None                         # per polygon: duplicate vertices (cutouts), evaluated on demand
+    self._spatial_index = {}                            # per-layer spatial_grid_index, built on demand
+
+
+  def append_polygons (self, coords, counts, layernum, is_port=False, is_via=False):
+    """Append a chunk of polygons that share the same layer number and flags
+
+    Args:
+        coords (array of [x,y]): vertices of all polygons in this chunk, one polygon after the other
+        counts (array of int): number of vertices for each polygon in this chunk
+        layernum (int): layer number assigned to these polygons
+        is_port (bool, optional): Treat as port polygon. Defaults to False.
+        is_via (bool, optional): Treat as via polygon. Defaults to False.
+    """
+    coords = np.asarray(coords, dtype=float).reshape(-1,2)
+    counts = np.asarray(counts, dtype=np.int64).reshape(-1)
+    if len(counts) == 0:
+      return
+    if np.any(counts < 1) or (np.sum(counts) != len(coords)):
+      print('ERROR: Invalid polygon data on layer ', layernum, ', vertex count does not match coordinates')
+      exit(1)
+    numpoly = len(counts)
+    self.append_arrays(coords, counts,
+                       np.full(numpoly, int(layernum), dtype=np.int64),
+                       np.full(numpoly, bool(is_port)),
+                       np.full(numpoly, bool(is_via)))
+
+
+  def append_arrays (self, coords, counts, layers, is_port, is_via):
+    """Append polygons given as columnar arrays, with per-polygon layer numbers and flags. No checks.
+
+    Args:
+        coords (array of [x,y]): vertices of all polygons, one polygon after the other
+        counts (array of int): number of vertices for each polygon
+        layers (array of int): layer number for each polygon
+        is_port (array of bool): port flag for each polygon
+        is_via (array of bool): via flag for each polygon
+    """
+    if len(counts) > 0:
+      self._pending.append((coords, counts, layers, is_port, is_via))
+      self._spatial_index = {}
+
+
+  def append_polygon (self, xy, layernum, is_port=False, is_via=False):
+    """Append one polygon
+
+    Args:
+        xy (array of [x,y]): polygon points
+        layernum (int): layer number assigned to this polygon
+        is_port (bool, optional): Treat as port polygon. Defaults to False.
+        is_via (bool, optional): Treat as via polygon. Defaults to False.
+    """
+    xy = np.asarray(xy, dtype=float).reshape(-1,2)
+    self.append_polygons(xy, [len(xy)], layernum, is_port, is_via)
+
+
+  def extend (self, another_store):
+    """Append all polygons from another store, used for merging data from multiple GDSII files
+
+    Args:
+        another_store (polygon_store): data to add
+    """
+    self.append_arrays(another_store.coords,
+                       np.diff(another_store.offsets),
+                       another_store.layers,
+                       another_store.is_port,
+                       another_store.is_via)
+
+
+  def _compact (self):
+    """Combine pending chunks into the flat arrays, sort polygons by layer and update per-layer slices and bounding boxes
+    """
+    if len(self._pending) == 0:
+      return
+
+    counts  = [np.diff(self._offsets)] + [chunk[1] for chunk in self._pending]
+    coords  = np.concatenate([self._coords]  + [chunk[0] for chunk in self._pending])
+    layers  = np.concatenate([self._layers]  + [chunk[2] for chunk in self._pending])
+    is_port = np.concatenate([self._is_port] + [chunk[3] for chunk in self._pending])
+    is_via  = np.concatenate([self._is_via]  + [chunk[4] for chunk in self._pending])
+    counts  = np.concatenate(counts)
+    offsets = np.concatenate(([0], np.cumsum(counts))).astype(np.int64)
+    self._pending = []
+
+    # stable sort by layer number, so that each layer becomes one contiguous slice
+    order = np.argsort(layers, kind='stable')
+    if np.any(order != np.arange(len(order))):
+      new_counts  = counts[order]
+      new_offsets = np.concatenate(([0], np.cumsum(new_counts))).astype(np.int64)
+      # gather index for vertices: start of old polygon block + running index inside block
+      shift   = np.repeat(offsets[:-1][order] - new_offsets[:-1], new_counts)
+      coords  = coords[np.arange(new_offsets[-1]) + shift]
+      offsets = new_offsets
+      layers  = layers[order]
+      is_port = is_port[order]
+      is_via  = is_via[order]
+
+    self._coords  = coords
+    self._offsets = offsets
+    self._has_duplicates = None
+    self._spatial_index = {}
+    self._layers  = layers
+    self._is_port = is_port
+    self._is_via  = is_via
+
+    self._update_bbox()
+
+    # per-layer slices
+    unique_layers, first = np.unique(layers, return_index=True)
+    last = np.append(first[1:], len(layers))
+    self._layer_start = {int(layer): (int(start), int(stop)) for layer, start, stop in zip(unique_layers, first, last)}
+
+
+  def __len__ (self):
+    self._compact()
+    return len(self._layers)
+
+  @property
+  def coords (self):
+    self._compact()
+    return self._coords
+
+  @property
+  def offsets (self):
+    self._compact()
+    return self._offsets
+
+  @property
+  def layers (self):
+    self._compact()
+    return self._layers
+
+  @property
+  def is_port (self):
+    self._compact()
+    return self._is_port
+
+  @property
+  def is_via (self):
+    self._compact()
+    return self._is_via
+
+  @property
+  def bbox (self):
+    self._compact()
+    return self._bbox
+
+
+  def _update_bbox (self):
+    """Calculate per-polygon bounding box, one vectorized reduction over all vertices
+    """
+    starts = self._offsets[:-1]
+    if len(starts) > 0:
+      self._bbox = np.column_stack((np.minimum.reduceat(self._coords[:,0], starts),
+                                    np.maximum.reduceat(self._coords[:,0], starts),
+                                    np.minimum.reduceat(self._coords[:,1], starts),
+                                    np.maximum.reduceat(self._coords[:,1], starts)))
+    else:
+      self._bbox = np.zeros((0,4))
+
+
+  def get_layers (self):
+    """Return list of layer numbers that have polygons, sorted
+    Returns:
+        list of int: layer numbers
+    """
+    self._compact()
+    return list(self._layer_start.keys())
+
+
+  def get_layer_slice (self, layernum):
+    """Return slice of polygon indices for one layer, empty slice if layer has no polygons
+    Args:
+        layernum (int): layer number
+    Returns:
+        slice: polygon indices of that layer
+    """
+    self._compact()
+    start, stop = self._layer_start.get(int(layernum), (0,0))
+    return slice(start, stop)
+
+
+  def get_layer_coords (self, layernum):
+    """Return vertices of one layer as one contiguous block, together with offsets relative to that block
+    Args:
+        layernum (int): layer number
+    Returns:
+        coords (array), offsets (array of int): vertices of layer and vertex offsets, length numpolygons+1
+    """
+    s = self.get_layer_slice(layernum)
+    offsets = self._offsets[s.start:s.stop+1]
+    if len(offsets) == 0:
+      return np.zeros((0,2)), np.zeros(1, dtype=np.int64)
+    return self._coords[offsets[0]:offsets[-1]], offsets - offsets[0]
+
+
+  def get_points (self, index):
+    """Return vertices of one polygon as array view, no copy
+    Args:
+        index (int): polygon index
+    Returns:
+        array of [x,y]: polygon points
+    """
+    self._compact()
+    return self._coords[self._offsets[index]:self._offsets[index+1]]
+
+
+  def get_spatial_index (self, layernum):
+    """Return spatial index for polygons of one layer, index is built on first use and discarded when polygons are added
+    Args:
+        layernum (int): layer number
+    Returns:
+        spatial_grid_index: index, query results are polygon indices in this store
+    """
+    self._compact()
+    layernum = int(layernum)
+    if layernum not in self._spatial_index:
+      s = self.get_layer_slice(layernum)
+      self._spatial_index[layernum] = spatial_grid_index(self._bbox[s], s.start)
+    return self._spatial_index[layernum]
+
+
+  def query_box (self, layernum, xmin, xmax, ymin, ymax, distance=0):
+    """Find polygons on one layer with bounding box overlapping a box
+    Args:
+        layernum (int): layer number
+        xmin, xmax, ymin, ymax (float): box
+        distance (float, optional): box is enlarged by this value. Defaults to 0.
+    Returns:
+        array of int: polygon indices
+    """
+    return self.get_spatial_index(layernum).query_boxes([[xmin, xmax, ymin, ymax]], distance)[1]
+
+
+  def query_boxes (self, layernum, boxes, distance=0):
+    """Find polygons on one layer with bounding box overlapping boxes, vectorized over all boxes
+    Args:
+        layernum (int): layer number
+        boxes (array of [xmin, xmax, ymin, ymax]): query boxes
+        distance (float, optional): boxes are enlarged by this value. Defaults to 0.
+    Returns:
+        box_index (array of int), polygon_index (array of int): all pairs of query box and polygon
+    """
+    return self.get_spatial_index(layernum).query_boxes(boxes, distance)
+
+
+  def query_points (self, layernum, points, distance=0):
+    """Find polygons on one layer with bounding box near points, vectorized over all points
+    Args:
+        layernum (int): layer number
+        points (array of [x,y]): query points
+        distance (float, optional): search distance. Defaults to 0.
+    Returns:
+        point_index (array of int), polygon_index (array of int): all pairs of point and polygon
+    """
+    return self.get_spatial_index(layernum).query_points(points, distance)
+
+
+  def get_connected (self, layer_pairs, seed_indices):
+    """Find polygons that are connected to seed polygons, through chains of overlapping or touching polygons.
+    Connectivity is evaluated only between the given layer pairs, e.g. same layer and via to metal above/below.
+
+    Args:
+        layer_pairs (list of (int, int)): pairs of layer numbers where overlapping polygons are connected, (L,L) for polygons on the same layer
+        seed_indices (array of int): polygon indices of seed polygons, e.g. port polygons
+
+    Returns:
+        array of bool: True for each polygon connected to any seed polygon, including the seeds
+    """
+    self._compact()
+    source_list = []
+    target_list = []
+    for layer1, layer2 in set(layer_pairs):
+      layer1_slice = self.get_layer_slice(layer1)
+      if (layer1_slice.stop == layer1_slice.start) or (self.get_layer_slice(layer2).stop == self.get_layer_slice(layer2).start):
+        continue
+      # candidates from bounding box overlap, then exact geometric check
+      box_index, target = self.query_boxes(layer2, self._bbox[layer1_slice])
+      source = box_index + layer1_slice.start
+      if layer1 == layer2:
+        candidate = source < target
+        source = source[candidate]
+        target = target[candidate]
+      connected = polygon_pairs_intersect(self._coords, self._offsets, source, target)
+      source_list.append(source[connected])
+      target_list.append(target[connected])
+
+    labels = np.arange(len(self._layers))
+    if len(source_list) > 0:
+      labels = union_labels(labels, np.concatenate(source_list), np.concatenate(target_list))
+    seed_indices = np.asarray(seed_indices, dtype=np.int64)
+    return np.isin(labels, labels[seed_indices])
+
+
+  def keep_polygons (self, mask):
+    """Remove polygons from store, keep only polygons where mask is True
+
+    Args:
+        mask (array of bool): True for each polygon to keep
+    """
+    self._compact()
+    mask = np.asarray(mask, dtype=bool)
+    counts = np.diff(self._offsets)
+    self._coords  = self._coords[np.repeat(mask, counts)]
+    self._offsets = np.concatenate(([0], np.cumsum(counts[mask]))).astype(np.int64)
+    self._layers  = self._layers[mask]
+    self._is_port = self._is_port[mask]
+    self._is_via  = self._is_via[mask]
+    self._bbox    = self._bbox[mask]
+    self._has_duplicates = None
+    self._spatial_index = {}
+    unique_layers, first = np.unique(self._layers, return_index=True)
+    last = np.append(first[1:], len(self._layers))
+    self._layer_start = {int(layer): (int(start), int(stop)) for layer, start, stop in zip(unique_layers, first, last)}
+
+
+  def simplify (self, grid=0, min_area=0, tolerance=1e-6, fixed_layers=[]):
+    """Simplify all polygons in place: snap to grid, remove zero-length edges and collinear vertices,
+    then remove polygons with less than 3 vertices or area below min_area. Vectorized over all polygons.
+    Port polygons and polygons on fixed layers are not modified, because ports can be drawn as zero-area polygons.
+
+    Args:
+        grid (float, optional): snap grid, 0 for no snapping. Defaults to 0.
+        min_area (float, optional): minimum polygon area, 0 to keep all polygons. Defaults to 0.
+        tolerance (float, optional): maximum edge length and distance from line for vertex removal. Defaults to 1e-6.
+        fixed_layers (list of int, optional): layer numbers that are not modified, e.g. port layers before add_ports(). Defaults to [].
+
+    Returns:
+        dict: key is layer number, value is (polygons before, polygons after, vertices before, vertices after)
+    """
+    self._compact()
+    layers = self._layers
+    counts_before = np.diff(self._offsets)
+    fixed = self._is_port | np.isin(layers, [int(layernum) for layernum in fixed_layers])
+    coords, counts = simplify_polygon_arrays(self._coords, counts_before, grid, tolerance, fixed=fixed)
+
+    keep = counts >= 3
+    if min_area > 0:
+      keep = keep & (np.abs(polygon_areas(coords, counts)) >= min_area)
+    keep = keep | fixed
+
+    unique_layers, layer_index = np.unique(layers, return_inverse=True)
+    num_layers = len(unique_layers)
+    statistics = zip(unique_layers,
+                     np.bincount(layer_index, minlength=num_layers),
+                     np.bincount(layer_index, weights=keep, minlength=num_layers),
+                     np.bincount(layer_index, weights=counts_before, minlength=num_layers),
+                     np.bincount(layer_index, weights=counts*keep, minlength=num_layers))
+
+    self._coords = coords
+    self._offsets = np.concatenate(([0], np.cumsum(counts))).astype(np.int64)
+    self._update_bbox()
+    self.keep_polygons(keep)
+    return {int(layer): tuple(int(value) for value in values) for layer, *values in statistics}
+
+
+  def remove_duplicates (self, contained=True, tolerance=1e-6, fixed_layers=[]):
+    """Remove polygons that are identical to another polygon on the same layer, independent of start vertex and orientation,
+    and optionally rectangles that are fully contained in another rectangle on the same layer. 
+    Duplicates are found by hashing normalised vertex arrays, contained rectangles by the spatial index. 
+    Port polygons and polygons on fixed layers are not removed.
+
+    Args:
+        contained (bool, optional): also remove contained rectangles. Defaults to True.
+        tolerance (float, optional): coordinate tolerance. Defaults to 1e-6.
+        fixed_layers (list of int, optional): layer numbers where no polygons are removed, e.g. port layers before add_ports(). Defaults to [].
+
+    Returns:
+        dict: key is layer number, value is (polygons before, duplicates removed, contained rectangles removed)
+    """
+    self._compact()
+    layers = self._layers
+    counts = np.diff(self._offsets)
+    numpoly = len(counts)
+    fixed = self._is_port | np.isin(layers, [int(layernum) for layernum in fixed_layers])
+
+    # group polygons by layer, vertex count and hash of normalised vertices, first polygon in each group is the reference
+    quantized = np.round(normalize_polygon_arrays(self._coords, counts) / tolerance).astype(np.int64)
+    polygon_hash = hash_polygon_arrays(quantized, counts)
+    order = np.lexsort((polygon_hash, counts, layers))
+    new_group = np.ones(numpoly, dtype=bool)
+    new_group[1:] = (np.diff(layers[order]) != 0) | (np.diff(counts[order]) != 0) | (np.diff(polygon_hash[order]) != 0)
+    reference = np.empty(numpoly, dtype=np.int64)
+    reference[order] = order[np.flatnonzero(new_group)[np.cumsum(new_group) - 1]]
+
+    # exact comparison with reference polygon, so that hash collisions don't remove polygons
+    starts = self._offsets[:-1]
+    reference_vertex = np.arange(len(quantized)) + np.repeat(starts[reference] - starts, counts)
+    same_vertex = np.all(quantized == quantized[reference_vertex], axis=1)
+    same = np.zeros(numpoly, dtype=bool)
+    valid = counts > 0
+    same[valid] = np.logical_and.reduceat(same_vertex, starts[valid])
+    duplicate = same & (reference != np.arange(numpoly)) & ~fixed
+
+    # rectangles inside a larger rectangle on the same layer, equal rectangles keep the first one
+    inside = np.zeros(numpoly, dtype=bool)
+    if contained:
+      is_rect = rectangle_mask(self._coords, counts) & ~duplicate & ~fixed
+      for layernum in np.unique(layers[is_rect]):
+        layer_slice = self.get_layer_slice(layernum)
+        rectangles = np.flatnonzero(is_rect[layer_slice]) + layer_slice.start
+        box_index, candidate = self.query_boxes(layernum, self._bbox[rectangles])
+        rectangle = rectangles[box_index]
+        diff = self._bbox[rectangle] - self._bbox[candidate]
+        # bbox columns xmin, xmax, ymin, ymax: candidate must be smaller at min and larger at max
+        encloses = np.all(diff * np.array([1,-1,1,-1]) >= -tolerance, axis=1)
+        equal = np.all(np.abs(diff) <= tolerance, axis=1)
+        container = is_rect[candidate] & (candidate != rectangle) & encloses & (~equal | (candidate < rectangle))
+        inside[rectangle[container]] = True
+
+    unique_layers, layer_index = np.unique(layers, return_inverse=True)
+    num_layers = len(unique_layers)
+    statistics = zip(unique_layers,
+                     np.bincount(layer_index, minlength=num_layers),
+                     np.bincount(layer_index, weights=duplicate, minlength=num_layers),
+                     np.bincount(layer_index, weights=inside, minlength=num_layers))
+
+    self.keep_polygons(~(duplicate | inside))
+    return {int(layer): tuple(int(value) for value in values) for layer, *values in statistics}
+
+
+  def union_layers (self, layernums, precision=1e-4):
+    """Boolean union (gdspy "or") of all polygons on each of the given layers, in place.
+    Result has one polygon per connected region, holes are returned as keyhole polygons. 
+
+    Args:
+        layernums (list of int): layer numbers to unite
+        precision (float, optional): precision for gdspy boolean operation. Defaults to 1e-4.
+
+    Returns:
+        dict: key is layer number, value is (polygons before, polygons after)
+    """
+    self._compact()
+    keep = np.ones(len(self._layers), dtype=bool)
+    new_polygons = []
+    statistics = {}
+    for layernum in layernums:
+      layer_slice = self.get_layer_slice(layernum)
+      if layer_slice.stop - layer_slice.start < 2:
+        continue
+      polygons = [self.get_points(index) for index in range(layer_slice.start, layer_slice.stop)]
+      # max_points=0: don't fracture large polygons
+      result = gdspy.boolean(polygons, None, 'or', precision=precision, max_points=0)
+      united = [] if result is None else result.polygons
+      # gdspy can return regions that touch along an edge as separate polygons, unite again until nothing is merged
+      while len(united) > 1:
+        result = gdspy.boolean(united, None, 'or', precision=precision, max_points=0)
+        if len(result.polygons) == len(united):
+          break
+        united = result.polygons
+      # gdspy returns coordinates scaled from integer, snap x and y back to the original values on this layer
+      # otherwise edges of vias and ports that were aligned with the metal are now a tiny distance away, which can't be meshed
+      layer_coords = self._coords[self._offsets[layer_slice.start]:self._offsets[layer_slice.stop]]
+      united = [np.column_stack((snap_to_values(polypoints[:,0], layer_coords[:,0], precision),
+                                 snap_to_values(polypoints[:,1], layer_coords[:,1], precision))) for polypoints in united]
+      keep[layer_slice] = False
+      new_polygons.append((united, int(layernum)))
+      statistics[int(layernum)] = (layer_slice.stop - layer_slice.start, len(united))
+
+    self.keep_polygons(keep)
+    for united, layernum in new_polygons:
+      if len(united) > 0:
+        self.append_polygons(np.concatenate(united), [len(polypoints) for polypoints in united], layernum)
+    return statistics
+
+
+  def get_loops (self, index):
+    """Return boundary loops of one polygon: outer loop first, then holes. 
+    Polygons with cutouts (duplicate vertices) are decomposed into outer loop and holes, 
+    all other polygons return a single loop with the original points.
+    Args:
+        index (int): polygon index
+    Returns:
+        list of array: list of loops, each loop is an array of [x,y]
+    """
+    self._compact()
+    if self._has_duplicates is None:
+      # evaluated once for all polygons
+      self._has_duplicates = duplicate_vertex_mask(self._coords, np.diff(self._offsets))
+    points = self.get_points(index)
+    if self._has_duplicates[index]:
+      loops = split_keyhole_polygon(points)
+      if loops is not None:
+        return loops
+    return [points]
+
+
+
+class gds_polygon_view:
+  """
+    Lightweight read access to one polygon in polygon_store, with the same attributes as gds_polygon.
+    Coordinates are views into the store, no data is copied.
+  """
+  __slots__ = ('store', 'index')
+
+  def __init__ (self, store, index):
+    self.store = store
+    self.index = index
+
+  @property
+  def layernum (self):
+    return int(self.store.layers[self.index])
+
+  @property
+  def pts_x (self):
+    return self.store.get_points(self.index)[:,0]
+
+  @property
+  def pts_y (self):
+    return self.store.get_points(self.index)[:,1]
+
+  @property
+  def pts (self):
+    points = self.store.get_points(self.index)
+    return [points[:,0], points[:,1]]
+
+  @property
+  def xmin (self):
+    return self.store.bbox[self.index,0]
+
+  @property
+  def xmax (self):
+    return self.store.bbox[self.index,1]
+
+  @property
+  def ymin (self):
+    return self.store.bbox[self.index,2]
+
+  @property
+  def ymax (self):
+    return self.store.bbox[self.index,3]
+
+  @property
+  def is_port (self):
+    return bool(self.store.is_port[self.index])
+
+  @is_port.setter
+  def is_port (self, value):
+    self.store.is_port[self.index] = value
+
+  @property
+  def is_via (self):
+    return bool(self.store.is_via[self.index])
+
+  @is_via.setter
+  def is_via (self, value):
+    self.store.is_via[self.index] = value
+
+  @property
+  def CSXpoly (self):
+    return None
+
+  def __str__ (self):
+    """Create string representation of polygon data, useful for debugging
+    Returns:
+        string: string representation of polygon data
+    """
+    mystr = 'Layer = ' + str(self.layernum) + ', Polygon = ' + str(self.pts) + ', Via = ' + str(self.is_via)
+    return mystr
+
+
+
+class polygon_view_list:
+  """
+    Sequence of gds_polygon_view objects for all polygons in a polygon_store, 
+    provides backward compatibility for code that iterates over all_polygons_list.polygons
+  """
+
+  def __init__ (self, store):
+    self.store = store
+
+  def __len__ (self):
+    return len(self.store)
+
+  def __getitem__ (self, index):
+    if isinstance(index, slice):
+      return [gds_polygon_view(self.store, i) for i in range(*index.indices(len(self.store)))]
+    if index < 0:
+      index = index + len(self.store)
+    if (index < 0) or (index >= len(self.store)):
+      raise IndexError('polygon index out of range')
+    return gds_polygon_view(self.store, index)
+
+  def __iter__ (self):
+    for index in range(len(self.store)):
+      yield gds_polygon_view(self.store, index)
+
+  def append (self, poly):
+    """Append one instance of gds_polygon, same as all_polygons_list.append() but without bounding box update
+    Args:
+        poly (gds_polygon): Data for one single polygon
+    """
+    self.store.append_polygon(np.column_stack((poly.pts_x, poly.pts_y)), poly.layernum, poly.is_port, poly.is_via)
+
+
+
 class all_polygons_list:
   """
   Class instance holds all polygon data (all polygons with their layer data etc)
+  Polygon data is stored in a columnar polygon_store (.store), .polygons provides a view with one gds_polygon_view per polygon
   """
 
   def __init__ (self):
-    """Initialize empty list of polygons and empty bounding box dictionary
+    """Initialize empty polygon store and empty bounding box dictionary
     """
-    self.polygons = []
+    self.store = polygon_store()
     self.bounding_box = all_bounding_box_list() # manages bounding box per layer and global
 
+  @property
+  def polygons (self):
+    """Sequence of all polygons, each item is a gds_polygon_view into the polygon store
+    """
+    return polygon_view_list(self.store)
+
   def append (self, poly):
     """Append one instance of gds_polygon
     Args:
@@ -214,8 +983,31 @@ class all_polygons_list:
     """
     # before we append, combine points in polygon from pts_x and pts_y into pts
     poly.process_pts()
-    # add polygon to list
-    self.polygons.append (poly)
+    # add polygon to store
+    self.store.append_polygon(np.column_stack((poly.pts_x, poly.pts_y)), poly.layernum, poly.is_port, poly.is_via)
+
+  def add_layer_polygons (self, polygons, layernum, is_port=False, is_via=False):
+    """Bulk ingestion of many polygons on one layer, used in GDSII import. 
+    Point arrays are taken as they are (e.g. from gdspy), bounding box for this layer is calculated in one step.
+
+    Args:
+        polygons (list of array): list of polygons, each polygon is an array [[x1,y1],[x2,y2],...[xn,yn]]
+        layernum (int): layer number assigned to these polygons
+        is_port (bool, optional): Treat as port polygons. Defaults to False.
+        is_via (bool, optional): Treat as via polygons. Defaults to False.
+    """
+    if len(polygons) == 0:
+      return
+    counts = [len(polypoints) for polypoints in polygons]
+    coords = np.concatenate(polygons).astype(float, copy=False)
+
+    self.store.append_polygons(coords, counts, layernum, is_port, is_via)
+
+    # bounding box for this layer, one vectorized reduction over all vertices
+    xmin, ymin = np.min(coords, axis=0)
+    xmax, ymax = np.max(coords, axis=0)
+    self.bounding_box.update (layernum, xmin, xmax, ymin, ymax)
+
 
   def add_rectangle (self, x1,y1,x2,y2, layernum, is_port=False, is_via=False):
     """This function adds a rectangle, it can be called in code created manually. Not used in GDSII import.
@@ -230,17 +1022,7 @@ class all_polygons_list:
         is_via (bool, optional): Treat as via polygon. Defaults to False.
     """
     # append simple rectangle to list, this can also be done later, after reading GDSII file
-    poly = gds_polygon(layernum)
-    poly.add_vertex(x1,y1)
-    poly.add_vertex(x1,y2)
-    poly.add_vertex(x2,y2)
-    poly.add_vertex(x2,y1)
-    poly.is_port = is_port
-    poly.is_via = is_via
-    self.append(poly)
-
-    # need to update min and max here, for gds data that is done after reading file
-    self.bounding_box.update (layernum, min(x1,x2), max(x1,x2),min(y1,y2),max(y1,y2))
+    self.add_polygon([[x1,y1],[x1,y2],[x2,y2],[x2,y1]], layernum, is_port, is_via)
 
 
   def add_polygon (self, xy, layernum, is_port=False, is_via=False):
@@ -255,26 +1037,7 @@ class all_polygons_list:
     """
     # append polygon array to list, this can also be done later, after reading GDSII file
     # polygon data structure must be [[x1,y1],[x2,y2],...[xn,yn]]
-    xmin=float('inf')
-    ymin=float('inf')
-    xmax=float('-inf')
-    ymax=float('-inf')
-
-    poly = gds_polygon(layernum)
-    numpts = len(xy)
-    for pt in range(0, numpts):
-      pt = xy[pt]
-      x = pt[0]
-      y = pt[1]
-      poly.add_vertex(x,y)
-      # need to update min and max here, for gds data that is done after reading file
-      xmin = min(xmin, x)
-      xmax = max(xmax, x)
-      ymin = min(ymin, y)
-      ymax = max(ymax, y)      
-    # need to update min and max here, for gds data that is done after reading file
-    self.bounding_box.update (layernum, xmin, xmax, ymin, ymax)
-    self.append(poly)        
+    self.add_layer_polygons([np.asarray(xy, dtype=float).reshape(-1,2)], layernum, is_port, is_via)
 
 
   def set_bounding_box (self, xmin,xmax,ymin,ymax):
@@ -334,8 +1097,7 @@ class all_polygons_list:
         another_polygons_list (all_polygons_list): another polygon list, maybe from another GDSII import
     """
     
-    for polygon in another_polygons_list.polygons:
-      self.polygons.append(polygon)
+    self.store.extend(another_polygons_list.store)
     # also merge boundary information  
     self.bounding_box.merge(another_polygons_list.bounding_box)          
 
@@ -344,22 +1106,38 @@ class all_polygons_list:
 
 
 
-def merge_via_array (polygons, maxspacing):
+def get_via_merge_offset (maxspacing):
+  """Oversize/undersize value used for via array merging, vias are merged if their spacing is less than 2*offset
+
+  Args:
+      maxspacing (float): merge_polygon_size value
+
+  Returns:
+      float: offset value
+  """
+  return maxspacing/2 + 0.01
+
+
+def merge_via_array (polygons, maxspacing, engine='grid'):
   """Used internally in processing data from gdspy, does not work on our own all_polygons_list class!
 
   Args:
       polygons (_type_): LPPpolylist data
       maxspacing (float): offset for oversize/undersize of polygons during via array merge
+      engine (str, optional): 'grid' for fast clustering of rectangular vias, 'boolean' for offset/boolean/offset on all polygons. Defaults to 'grid'.
 
   Returns:
       _type_: LPPpolylist data
   """
 
+  if engine == 'grid':
+    return merge_via_array_grid(polygons, maxspacing)
+
   # Via array merging consists of 3 steps: oversize, merge, undersize
   # Value for oversize depends on via layer
   # Oversized vias touch if each via is oversized by half spacing
   
-  offset = maxspacing/2 + 0.01
+  offset = get_via_merge_offset(maxspacing)
   
   offsetpolygonset=gdspy.offset(polygons, offset, join='miter', tolerance=2, precision=0.001, join_first=False, max_points=199)
   mergedpolygonset=gdspy.boolean(offsetpolygonset, None,"or", max_points=199)
@@ -370,9 +1148,1322 @@ def merge_via_array (polygons, maxspacing):
 
 
 
+def rectangle_mask (coords, counts):
+  """Find polygons that are axis-aligned rectangles, vectorized over all polygons
+
+  Args:
+      coords (array of [x,y]): points of all polygons
+      counts (array of int): number of vertices for each polygon
+
+  Returns:
+      array of bool: True for each polygon that is an axis-aligned rectangle
+  """
+  mask = np.zeros(len(counts), dtype=bool)
+  if len(counts) == 0:
+    return mask
+  offsets = np.concatenate(([0], np.cumsum(counts)))
+  candidates = np.flatnonzero(counts == 4)
+  if len(candidates) == 0:
+    return mask
+  points = coords[offsets[candidates][:,None] + np.arange(4)]  # shape (n,4,2)
+  next_points = np.roll(points, -1, axis=1)
+  same_x = np.isclose(points[:,:,0], next_points[:,:,0])
+  same_y = np.isclose(points[:,:,1], next_points[:,:,1])
+  # each edge must be horizontal or vertical, with alternating direction and non-zero size
+  is_rect = np.all(same_x != same_y, axis=1) & np.all(same_x == np.roll(same_y, 1, axis=1), axis=1)
+  mask[candidates[is_rect]] = True
+  return mask
+
+
+def union_labels (labels, source, target):
+  """Union-find on label array: hook larger root to smaller root, then compress paths, until all pairs have the same root
+
+  Args:
+      labels (array of int): initial labels, each label must point to an index with label <= index
+      source (array of int): first index of each pair
+      target (array of int): second index of each pair
+
+  Returns:
+      array of int: labels, connected indices have the same label
+  """
+  while len(source) > 0:
+    label_source = labels[source]
+    label_target = labels[target]
+    differs = label_source != label_target
+    if not np.any(differs):
+      break
+    np.minimum.at(labels, np.maximum(label_source, label_target)[differs], np.minimum(label_source, label_target)[differs])
+    while True:
+      compressed = labels[labels]
+      if np.array_equal(compressed, labels):
+        break
+      labels = compressed
+  return labels
+
+
+def get_via_clusters (bbox, merge_limit, tolerance=1e-6):
+  """Find clusters of vias that are merged by oversize/undersize with merge_limit = 2 * offset.
+  Vias are bucketed on a spatial hash grid with cell size = smallest via size + merge_limit, so that all vias in one grid cell
+  are merged. Grid cells in the same row or column are connected if the gap between their outermost vias is not larger than merge_limit,
+  only for diagonal neighbours that are not connected otherwise, the individual vias are compared.
+  Vias with gap equal to merge_limit are merged, because the oversized polygons touch.
+
+  Args:
+      bbox (array of [xmin,xmax,ymin,ymax]): bounding box for each via, same columns as polygon_store.bbox
+      merge_limit (float): vias with gap up to this value are merged
+      tolerance (float, optional): tolerance for gap comparison, much smaller than database unit. Defaults to 1e-6.
+
+  Returns:
+      array of int: cluster label for each via
+  """
+  num = len(bbox)
+  if num < 2:
+    return np.arange(num)
+
+  via_min = bbox[:,[0,2]]
+  via_max = bbox[:,[1,3]]
+  size = via_max - via_min
+  merge_limit = merge_limit + tolerance
+  cell_size = np.min(size, axis=0) + merge_limit
+  # largest distance in grid cells where vias can still be merged
+  reach = np.ceil((np.max(size, axis=0) + merge_limit) / cell_size).astype(np.int64)
+  cell_index = np.floor((via_min - np.min(via_min, axis=0)) / cell_size).astype(np.int64)
+  cell_stride = np.max(cell_index[:,1]) + 2 * reach[1] + 1
+  cell_keys, via_cell = np.unique(cell_index[:,0] * cell_stride + cell_index[:,1] + reach[1], return_inverse=True)
+  via_cell = via_cell.ravel()
+  num_cells = len(cell_keys)
+
+  # outermost via edges in each grid cell
+  cell_min = np.full((num_cells,2), np.inf)
+  cell_max = np.full((num_cells,2), -np.inf)
+  np.minimum.at(cell_min, via_cell, via_min)
+  np.maximum.at(cell_max, via_cell, via_max)
+
+  # neighbour cells in positive direction, the other half is covered by symmetry
+  def neighbour_cells (dx, dy):
+    neighbour_key = cell_keys + dx * cell_stride + dy
+    position = np.minimum(np.searchsorted(cell_keys, neighbour_key), num_cells-1)
+    found = np.flatnonzero(cell_keys[position] == neighbour_key)
+    return found, position[found]
+
+  source_list = []
+  target_list = []
+  for dx, dy in [(dx, 0) for dx in range(1, reach[0]+1)] + [(0, dy) for dy in range(1, reach[1]+1)]:
+    axis = 0 if dy == 0 else 1
+    source, target = neighbour_cells(dx, dy)
+    connected = cell_min[target,axis] - cell_max[source,axis] <= merge_limit
+    source_list.append(source[connected])
+    target_list.append(target[connected])
+  cell_labels = union_labels(np.arange(num_cells), np.concatenate(source_list), np.concatenate(target_list))
+
+  # diagonal neighbours: compare individual vias, only for cells that are not connected yet and might be merged
+  order = np.argsort(via_cell, kind='stable')
+  cell_start = np.searchsorted(via_cell[order], np.arange(num_cells))
+  cell_count = np.bincount(via_cell, minlength=num_cells)
+  source_list = []
+  target_list = []
+  for dx in range(1, reach[0]+1):
+    for dy in [dy for dy in range(-reach[1], reach[1]+1) if dy != 0]:
+      source, target = neighbour_cells(dx, dy)
+      lower, upper = (source, target) if dy > 0 else (target, source)
+      candidate = (cell_labels[source] != cell_labels[target]) & \
+                  (cell_min[target,0] - cell_max[source,0] <= merge_limit) & (cell_min[upper,1] - cell_max[lower,1] <= merge_limit)
+      source = source[candidate]
+      target = target[candidate]
+      if len(source) == 0:
+        continue
+      # all via pairs between the two cells
+      num_pairs = cell_count[source] * cell_count[target]
+      pair = np.repeat(np.arange(len(source)), num_pairs)
+      local = np.arange(np.sum(num_pairs)) - np.repeat(np.cumsum(num_pairs) - num_pairs, num_pairs)
+      via_source = order[cell_start[source][pair] + local // cell_count[target][pair]]
+      via_target = order[cell_start[target][pair] + local % cell_count[target][pair]]
+      gap = np.maximum(via_min[via_source], via_min[via_target]) - np.minimum(via_max[via_source], via_max[via_target])
+      connected = np.all(gap <= merge_limit, axis=1)
+      source_list.append(via_cell[via_source[connected]])
+      target_list.append(via_cell[via_target[connected]])
+  if len(source_list) > 0:
+    cell_labels = union_labels(cell_labels, np.concatenate(source_list), np.concatenate(target_list))
+
+  return cell_labels[via_cell]
+
+
+def count_unique_per_group (groups, num_groups, *keys):
+  """Count unique key values in each group
+
+  Args:
+      groups (array of int): group index for each item
+      num_groups (int): number of groups
+      keys (arrays of int): one or more key columns, unique combinations are counted
+
+  Returns:
+      array of int: number of unique keys for each group
+  """
+  order = np.lexsort(keys[::-1] + (groups,))
+  columns = np.column_stack((groups,) + keys)[order]
+  first = np.ones(len(order), dtype=bool)
+  first[1:] = np.any(columns[1:] != columns[:-1], axis=1)
+  return np.bincount(groups[order][first], minlength=num_groups)
+
+
+def merge_via_array_grid (polygons, maxspacing):
+  """Used internally in processing data from gdspy: fast via array merging for rectangular vias.
+  Vias are clustered with the same merge distance as merge_via_array(). Clusters that form a complete regular array
+  of same size rectangles are replaced by their bounding rectangle. All other clusters, including those
+  with non-rectangular polygons, are merged by offset/boolean/offset as before.
+
+  Args:
+      polygons (_type_): LPPpolylist data
+      maxspacing (float): offset for oversize/undersize of polygons during via array merge
+
+  Returns:
+      _type_: LPPpolylist data
+  """
+  if len(polygons) == 0:
+    return polygons
+  offset = get_via_merge_offset(maxspacing)
+  counts = np.array([len(polypoints) for polypoints in polygons])
+  coords = np.concatenate(polygons)
+  offsets = np.concatenate(([0], np.cumsum(counts)))
+  xmin = np.minimum.reduceat(coords[:,0], offsets[:-1])
+  ymin = np.minimum.reduceat(coords[:,1], offsets[:-1])
+  xmax = np.maximum.reduceat(coords[:,0], offsets[:-1])
+  ymax = np.maximum.reduceat(coords[:,1], offsets[:-1])
+  bbox = np.column_stack((xmin, xmax, ymin, ymax))
+
+  # bounding box of non-rectangular polygons is larger than the polygon, so these clusters can be larger than required,
+  # but they are evaluated by the boolean engine anyway
+  labels = get_via_clusters(bbox, 2 * offset)
+  cluster_ids, cluster_index, cluster_size = np.unique(labels, return_inverse=True, return_counts=True)
+  num_clusters = len(cluster_ids)
+
+  # check for complete regular array: all rectangles with same size, and columns x rows positions occupied once
+  is_rect = rectangle_mask(coords, counts)
+  grid = np.round(bbox / 1e-6).astype(np.int64)
+  size = grid[:,[1,3]] - grid[:,[0,2]]
+  complete = np.bincount(cluster_index, weights=~is_rect, minlength=num_clusters) == 0
+  for column in (0,1):
+    size_min = np.full(num_clusters, np.iinfo(np.int64).max)
+    size_max = np.full(num_clusters, np.iinfo(np.int64).min)
+    np.minimum.at(size_min, cluster_index, size[:,column])
+    np.maximum.at(size_max, cluster_index, size[:,column])
+    complete &= size_min == size_max
+  num_x = count_unique_per_group(cluster_index, num_clusters, grid[:,0])
+  num_y = count_unique_per_group(cluster_index, num_clusters, grid[:,2])
+  num_xy = count_unique_per_group(cluster_index, num_clusters, grid[:,0], grid[:,2])
+  complete &= (num_xy == cluster_size) & (num_x * num_y == cluster_size)
+
+  # bounding rectangle for complete clusters, with same vertex order and precision as the offset result from gdspy
+  cluster_bbox = np.empty((num_clusters, 4))
+  cluster_bbox[:,[0,2]] = np.inf
+  cluster_bbox[:,[1,3]] = -np.inf
+  np.minimum.at(cluster_bbox[:,0], cluster_index, xmin)
+  np.maximum.at(cluster_bbox[:,1], cluster_index, xmax)
+  np.minimum.at(cluster_bbox[:,2], cluster_index, ymin)
+  np.maximum.at(cluster_bbox[:,3], cluster_index, ymax)
+  cluster_bbox = np.round(cluster_bbox * 1000) / 1000
+  merged = [np.array([[x2, y2], [x1, y2], [x1, y1], [x2, y1]]) for x1, x2, y1, y2 in cluster_bbox[complete]]
+
+  # all other clusters are merged by offset/boolean/offset
+  fallback = np.flatnonzero(~complete[cluster_index])
+  if len(fallback) > 0:
+    merged.extend(merge_via_array([polygons[n] for n in fallback], maxspacing, engine='boolean'))
+  return merged
+
+
+def merge_via_layer_shared (shm_name, num_points, num_polygons, maxspacing, engine):
+  """Worker function for parallel via array merging: polygon data is read from shared memory instead of pickling
+
+  Args:
+      shm_name (string): name of shared memory block, with num_points [x,y] coordinates followed by num_polygons vertex counts
+      num_points (int): total number of vertices
+      num_polygons (int): number of polygons
+      maxspacing (float): offset for oversize/undersize of polygons during via array merge
+      engine (str): 'grid' or 'boolean', see merge_via_array()
+
+  Returns:
+      coords (array of [x,y]), counts (array of int): merged polygons
+  """
+  shm = shared_memory.SharedMemory(name=shm_name)
+  try:
+    coords = np.ndarray((num_points,2), dtype=np.float64, buffer=shm.buf)
+    counts = np.ndarray((num_polygons,), dtype=np.int64, buffer=shm.buf, offset=coords.nbytes)
+    polygons = [np.array(polypoints) for polypoints in np.split(coords, np.cumsum(counts)[:-1])]
+    # views on shared memory must be released before closing
+    del coords, counts
+  finally:
+    shm.close()
+  merged = merge_via_array(polygons, maxspacing, engine)
+  if len(merged) == 0:
+    return np.zeros((0,2)), np.zeros(0, dtype=np.int64)
+  return np.concatenate(merged), np.array([len(polypoints) for polypoints in merged], dtype=np.int64)
+
+
+def merge_via_layers (via_layer_polygons, maxspacing, engine='grid', workers=1):
+  """Used internally in processing data from gdspy: via array merging for multiple layers, optional in parallel processes.
+  Layers are independent, so each layer is one job for the process pool. Polygon data is passed to the worker
+  processes in shared memory.
+
+  Args:
+      via_layer_polygons (dict): key is (layer, datatype), value is list of polygons
+      maxspacing (float): offset for oversize/undersize of polygons during via array merge
+      engine (str, optional): 'grid' or 'boolean', see merge_via_array(). Defaults to 'grid'.
+      workers (int, optional): number of worker processes, 0 for number of CPU cores. Defaults to 1 (no parallel processing).
+
+  Returns:
+      dict: key is (layer, datatype), value is list of merged polygons
+  """
+  if workers == 0:
+    workers = os.cpu_count() or 1
+  workers = min(workers, len(via_layer_polygons))
+  if workers <= 1:
+    return {key: merge_via_array(polygons, maxspacing, engine) for key, polygons in via_layer_polygons.items()}
+
+  merged_layers = {}
+  shared_blocks = []
+  try:
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+      futures = {}
+      # start with largest layers
+      for key, polygons in sorted(via_layer_polygons.items(), key=lambda item: -len(item[1])):
+        counts = np.array([len(polypoints) for polypoints in polygons], dtype=np.int64)
+        coords = np.concatenate(polygons).astype(np.float64)
+        shm = shared_memory.SharedMemory(create=True, size=coords.nbytes + counts.nbytes)
+        shared_blocks.append(shm)
+        np.ndarray(coords.shape, dtype=np.float64, buffer=shm.buf)[:] = coords
+        np.ndarray(counts.shape, dtype=np.int64, buffer=shm.buf, offset=coords.nbytes)[:] = counts
+        futures[key] = executor.submit(merge_via_layer_shared, shm.name, len(coords), len(counts), maxspacing, engine)
+      for key, future in futures.items():
+        coords, counts = future.result()
+        merged_layers[key] = np.split(coords, np.cumsum(counts)[:-1]) if len(counts) > 0 else []
+  finally:
+    for shm in shared_blocks:
+      shm.close()
+      shm.unlink()
+  return merged_layers
+
+
+def polygon_pairs_intersect (coords, offsets, index_a, index_b, max_edge_pairs=2000000):
+  """Exact check if polygons overlap or touch, vectorized over many polygon pairs.
+  Two polygons intersect if any of their edges intersect, or if one polygon is completely inside the other.
+
+  Args:
+      coords (array of [x,y]): vertices of all polygons
+      offsets (array of int): vertex offset per polygon, length numpolygons+1
+      index_a (array of int): first polygon of each pair
+      index_b (array of int): second polygon of each pair
+      max_edge_pairs (int, optional): limit for number of edge pairs evaluated at once, to limit memory. Defaults to 2000000.
+
+  Returns:
+      array of bool: True for each pair that intersects
+  """
+  index_a = np.asarray(index_a, dtype=np.int64)
+  index_b = np.asarray(index_b, dtype=np.int64)
+  result = np.zeros(len(index_a), dtype=bool)
+  if len(index_a) == 0:
+    return result
+  counts = np.diff(offsets)
+  eps = 1e-9
+
+  def next_vertex (vertex, polygon):
+    # next vertex in closed polygon loop
+    following = vertex + 1
+    return np.where(following == offsets[polygon+1], offsets[polygon], following)
+
+  # evaluate chunks of pairs, each chunk with limited number of edge pairs
+  num_edge_pairs = counts[index_a] * counts[index_b]
+  total = np.cumsum(num_edge_pairs)
+  chunk_ends = np.unique(np.append(np.searchsorted(total, np.arange(max_edge_pairs, total[-1], max_edge_pairs)) + 1, len(index_a)))
+  chunk_start = 0
+  for end in chunk_ends:
+    a = index_a[chunk_start:end]
+    b = index_b[chunk_start:end]
+    num = num_edge_pairs[chunk_start:end]
+    pair = np.repeat(np.arange(len(a)), num)
+    local = np.arange(np.sum(num)) - np.repeat(np.cumsum(num) - num, num)
+    edge_a = offsets[a][pair] + local // counts[b][pair]
+    edge_b = offsets[b][pair] + local % counts[b][pair]
+    p1 = coords[edge_a]
+    p2 = coords[next_vertex(edge_a, a[pair])]
+    q1 = coords[edge_b]
+    q2 = coords[next_vertex(edge_b, b[pair])]
+
+    # edges intersect or touch: orientation test plus bounding box check for collinear edges
+    def orientation (o, d, p):
+      value = (d[:,0]-o[:,0])*(p[:,1]-o[:,1]) - (d[:,1]-o[:,1])*(p[:,0]-o[:,0])
+      return np.where(np.abs(value) < eps, 0, np.sign(value))
+    crossing = (orientation(p1,p2,q1) * orientation(p1,p2,q2) <= 0) & (orientation(q1,q2,p1) * orientation(q1,q2,p2) <= 0)
+    crossing &= (np.minimum(p1[:,0],p2[:,0]) <= np.maximum(q1[:,0],q2[:,0]) + eps) & (np.minimum(q1[:,0],q2[:,0]) <= np.maximum(p1[:,0],p2[:,0]) + eps)
+    crossing &= (np.minimum(p1[:,1],p2[:,1]) <= np.maximum(q1[:,1],q2[:,1]) + eps) & (np.minimum(q1[:,1],q2[:,1]) <= np.maximum(p1[:,1],p2[:,1]) + eps)
+    chunk_result = np.bincount(pair[crossing], minlength=len(a)) > 0
+
+    # no edge intersection: check first vertex of each polygon inside the other polygon (crossing number)
+    # each edge of the other polygon is used once: with first edge of this polygon
+    first_edge_a = (local // counts[b][pair]) == 0
+    first_edge_b = (local % counts[b][pair]) == 0
+    for point_polygon, edge_start, edge_end, use in ((a, q1, q2, first_edge_a), (b, p1, p2, first_edge_b)):
+      point = coords[offsets[point_polygon]][pair]
+      straddle = use & ((edge_start[:,1] > point[:,1]) != (edge_end[:,1] > point[:,1]))
+      with np.errstate(divide='ignore', invalid='ignore'):
+        x_cross = edge_start[:,0] + (point[:,1]-edge_start[:,1]) * (edge_end[:,0]-edge_start[:,0]) / (edge_end[:,1]-edge_start[:,1])
+      crossings = np.bincount(pair[straddle & (point[:,0] < x_cross)], minlength=len(a))
+      chunk_result |= (crossings % 2) == 1
+
+    result[chunk_start:end] = chunk_result
+    chunk_start = end
+  return result
+
+
+def find_duplicate_vertices (polygons):
+  """Find polygons that have duplicate vertices (cutouts), vectorized over all polygons using row-uniqueness of the points
+
+  Args:
+      polygons (list of array): list of polygons, each polygon is an array [[x1,y1],[x2,y2],...[xn,yn]]
+
+  Returns:
+      array of bool: True for each polygon that has at least one duplicate vertex
+  """
+  if len(polygons) == 0:
+    return np.zeros(0, dtype=bool)
+  counts = np.array([len(polypoints) for polypoints in polygons])
+  return duplicate_vertex_mask(np.concatenate(polygons), counts)
+
+
+def duplicate_vertex_mask (coords, counts):
+  """Same as find_duplicate_vertices, but for polygons stored as flat coordinate array with vertex count per polygon
+
+  Args:
+      coords (array of [x,y]): vertices of all polygons, one polygon after the other
+      counts (array of int): number of vertices for each polygon
+
+  Returns:
+      array of bool: True for each polygon that has at least one duplicate vertex
+  """
+  numpoly = len(counts)
+  if numpoly == 0:
+    return np.zeros(0, dtype=bool)
+  # tag each vertex with its polygon index, so that one np.unique call handles all polygons
+  rows = np.column_stack((np.repeat(np.arange(numpoly), counts), coords))
+  unique_rows = np.unique(rows, axis=0)
+  unique_counts = np.bincount(unique_rows[:,0].astype(np.int64), minlength=numpoly)
+  return unique_counts < counts
+
+
+def polygon_area (polypoints):
+  """Signed area of polygon (shoelace formula), positive for counter-clockwise orientation
+
+  Args:
+      polypoints (array of [x,y]): polygon points
+
+  Returns:
+      float: signed area
+  """
+  x = polypoints[:,0]
+  y = polypoints[:,1]
+  return 0.5 * (np.dot(x, np.roll(y,-1)) - np.dot(y, np.roll(x,-1)))
+
+
+def polygon_areas (coords, counts):
+  """Signed area of polygons (shoelace formula), vectorized over polygons stored as flat coordinate array
+
+  Args:
+      coords (array of [x,y]): vertices of all polygons, one polygon after the other
+      counts (array of int): number of vertices for each polygon
+
+  Returns:
+      array of float: signed area for each polygon, positive for counter-clockwise orientation
+  """
+  counts = np.asarray(counts, dtype=np.int64)
+  polygon = np.repeat(np.arange(len(counts)), counts)
+  next_index = get_next_vertex_index(counts)
+  cross = coords[:,0] * coords[next_index,1] - coords[next_index,0] * coords[:,1]
+  return 0.5 * np.bincount(polygon, weights=cross, minlength=len(counts))
+
+
+def normalize_polygon_arrays (coords, counts):
+  """Reorder polygon vertices to a normalised form: counter-clockwise, starting at the vertex with lowest x (then lowest y).
+  Identical polygons with different start vertex or orientation then have identical vertex arrays.
+
+  Args:
+      coords (array of [x,y]): vertices of all polygons, one polygon after the other
+      counts (array of int): number of vertices for each polygon
+
+  Returns:
+      array of [x,y]: reordered vertices, same layout as coords
+  """
+  counts = np.asarray(counts, dtype=np.int64)
+  polygon = np.repeat(np.arange(len(counts)), counts)
+  starts = np.cumsum(counts) - counts
+  # vertices sorted by polygon, then x, then y: first entry of each polygon block is the start vertex
+  order = np.lexsort((coords[:,1], coords[:,0], polygon))
+  valid = counts > 0
+  rotation = np.zeros(len(counts), dtype=np.int64)
+  rotation[valid] = order[starts[valid]] - starts[valid]
+  direction = np.where(polygon_areas(coords, counts) < 0, -1, 1)
+  local = np.arange(len(coords)) - starts[polygon]
+  source = starts[polygon] + (rotation[polygon] + direction[polygon] * local) % counts[polygon]
+  return coords[source]
+
+
+def hash_polygon_arrays (quantized, counts):
+  """Hash value for each polygon from integer vertex coordinates, vectorized over all polygons
+
+  Args:
+      quantized (array of [x,y] int): vertices of all polygons as integer values
+      counts (array of int): number of vertices for each polygon
+
+  Returns:
+      array of uint64: hash value for each polygon, depends on vertex order
+  """
+  counts = np.asarray(counts, dtype=np.int64)
+  polygon = np.repeat(np.arange(len(counts)), counts)
+  local = (np.arange(len(quantized)) - (np.cumsum(counts) - counts)[polygon]).astype(np.uint64)
+  values = quantized.astype(np.uint64)
+  # multiply-xor mixing with wrap-around, then sum per polygon
+  vertex_hash = (values[:,0] * np.uint64(0x9E3779B97F4A7C15)) ^ (values[:,1] * np.uint64(0xC2B2AE3D27D4EB4F)) ^ ((local + np.uint64(1)) * np.uint64(0x165667B19E3779F9))
+  vertex_hash = vertex_hash * np.uint64(0xFF51AFD7ED558CCD)
+  polygon_hash = np.zeros(len(counts), dtype=np.uint64)
+  valid = counts > 0
+  polygon_hash[valid] = np.add.reduceat(vertex_hash, (np.cumsum(counts) - counts)[valid])
+  return polygon_hash
+
+
+def get_next_vertex_index (counts):
+  """Index of next vertex in the same polygon, for polygons stored as flat coordinate array.
+  The last vertex of each polygon is followed by the first vertex of that polygon.
+
+  Args:
+      counts (array of int): number of vertices for each polygon, can be 0
+
+  Returns:
+      array of int: index of next vertex for each vertex
+  """
+  counts = np.asarray(counts, dtype=np.int64)
+  starts = np.cumsum(counts) - counts
+  next_index = np.arange(np.sum(counts)) + 1
+  valid = counts > 0
+  next_index[(starts + counts - 1)[valid]] = starts[valid]
+  return next_index
+
+
+def simplify_polygon_arrays (coords, counts, grid=0, tolerance=1e-6, fixed=None):
+  """Snap polygon vertices to grid, then remove zero-length edges and collinear vertices, vectorized over all polygons.
+  Vertices where the boundary reverses direction (cut lines of keyhole polygons) are kept.
+  Polygons can end up with less than 3 vertices, these are not removed here.
+
+  Args:
+      coords (array of [x,y]): vertices of all polygons, one polygon after the other
+      counts (array of int): number of vertices for each polygon
+      grid (float, optional): snap grid, 0 for no snapping. Defaults to 0.
+      tolerance (float, optional): maximum edge length and distance from line for vertex removal. Defaults to 1e-6.
+      fixed (array of bool, optional): polygons that are not modified, e.g. ports. Defaults to None.
+
+  Returns:
+      coords (array of [x,y]), counts (array of int): simplified polygons, same number of polygons as input
+  """
+  coords = np.asarray(coords, dtype=float).reshape(-1,2)
+  counts = np.asarray(counts, dtype=np.int64)
+  if fixed is None:
+    fixed = np.zeros(len(counts), dtype=bool)
+  if grid > 0:
+    coords = np.where(np.repeat(fixed, counts)[:,None], coords, np.round(coords / grid) * grid)
+
+  # each pass removes all zero-length edges, or all collinear vertices, until nothing changes
+  while len(coords) > 0:
+    polygon = np.repeat(np.arange(len(counts)), counts)
+    next_index = get_next_vertex_index(counts)
+    prev_index = np.empty_like(next_index)
+    prev_index[next_index] = np.arange(len(next_index))
+    d_prev = coords - coords[prev_index]
+    d_next = coords[next_index] - coords
+
+    # zero-length edge to previous vertex
+    remove = np.hypot(d_prev[:,0], d_prev[:,1]) <= tolerance
+    if not np.any(remove):
+      # vertex on straight line between neighbours, and boundary continues in the same direction
+      cross = d_prev[:,0] * d_next[:,1] - d_prev[:,1] * d_next[:,0]
+      dot = d_prev[:,0] * d_next[:,0] + d_prev[:,1] * d_next[:,1]
+      chord = np.hypot(d_prev[:,0] + d_next[:,0], d_prev[:,1] + d_next[:,1])
+      remove = (np.abs(cross) <= tolerance * chord) & (dot > 0)
+    remove = remove & ~fixed[polygon]
+    if not np.any(remove):
+      break
+
+    coords = coords[~remove]
+    counts = np.bincount(polygon[~remove], minlength=len(counts))
+  return coords, counts
+
+
+def snap_to_values (values, reference, tolerance):
+  """Replace values by the nearest reference value within tolerance, so that coordinates from boolean operations
+  (scaled to integer and back) are bit-identical to the original coordinates again
+
+  Args:
+      values (array of float): values to snap
+      reference (array of float): original values
+      tolerance (float): maximum distance for snapping
+
+  Returns:
+      array of float: snapped values, values without reference value in tolerance are unchanged
+  """
+  reference = np.unique(reference)
+  if len(reference) == 0:
+    return values
+  position = np.clip(np.searchsorted(reference, values), 1, max(len(reference)-1, 1))
+  lower = reference[position-1]
+  upper = reference[np.minimum(position, len(reference)-1)]
+  nearest = np.where(np.abs(values - lower) <= np.abs(upper - values), lower, upper)
+  return np.where(np.abs(nearest - values) <= tolerance, nearest, values)
+
+
+def get_circumcenter (p1, p2, p3):
+  """Center of circle through three points
+
+  Args:
+      p1, p2, p3 (array [x,y]): points on circle
+
+  Returns:
+      array [x,y]: center, None if points are collinear
+  """
+  ax, ay = p2 - p1
+  bx, by = p3 - p1
+  d = 2 * (ax*by - ay*bx)
+  if abs(d) < 1e-12:
+    return None
+  a2 = ax*ax + ay*ay
+  b2 = bx*bx + by*by
+  return p1 + np.array([(by*a2 - ay*b2) / d, (ax*b2 - bx*a2) / d])
+
+
+def get_arc_center (points, tolerance, max_arc_angle):
+  """Check if polyline points can be replaced by one circle arc through first and last point.
+  All points must be within tolerance of the arc, and the arc must be within tolerance of the polyline edges.
+
+  Args:
+      points (array of [x,y]): polyline points, at least 3
+      tolerance (float): maximum deviation
+      max_arc_angle (float): maximum arc angle in radians, must be less than pi
+
+  Returns:
+      array [x,y]: arc center, None if points don't fit an arc
+  """
+  center = get_circumcenter(points[0], points[len(points)//2], points[-1])
+  if center is None:
+    return None
+  radius = np.hypot(*(points[0] - center))
+  if np.max(np.abs(np.hypot(points[:,0] - center[0], points[:,1] - center[1]) - radius)) > tolerance:
+    return None
+  # sagitta of each polyline edge = deviation between arc and edge, sum of subtended angles = arc angle
+  half_length = np.minimum(np.hypot(*np.diff(points, axis=0).T) / 2, radius)
+  if np.max(radius - np.sqrt(radius**2 - half_length**2)) > tolerance:
+    return None
+  if np.sum(2 * np.arcsin(half_length / radius)) > max_arc_angle:
+    return None
+  return center
+
+
+def decimate_polyline (points, tolerance):
+  """Ramer-Douglas-Peucker decimation of open polyline, first and last point are kept
+
+  Args:
+      points (array of [x,y]): polyline points
+      tolerance (float): maximum distance of removed points from decimated polyline
+
+  Returns:
+      list of int: indices of kept points
+  """
+  keep = [0, len(points)-1]
+  pending = [(0, len(points)-1)]
+  while len(pending) > 0:
+    start, end = pending.pop()
+    if end - start < 2:
+      continue
+    direction = points[end] - points[start]
+    length = np.hypot(*direction)
+    offset = points[start+1:end] - points[start]
+    if length > 0:
+      distance = np.abs(offset[:,0]*direction[1] - offset[:,1]*direction[0]) / length
+    else:
+      distance = np.hypot(offset[:,0], offset[:,1])
+    farthest = int(np.argmax(distance))
+    if distance[farthest] > tolerance:
+      split = start + 1 + farthest
+      keep.append(split)
+      pending.extend([(start, split), (split, end)])
+  return sorted(keep)
+
+
+def fit_polygon_arcs (points, tolerance, use_arcs=True, max_turn_angle=30, min_points=5, max_arc_angle=120):
+  """Replace runs of short segments on polygonised circles and arcs by circle arcs, or by a coarser polyline.
+  A run is a sequence of vertices where the boundary turns by a small angle, always in the same direction.
+  Other vertices, e.g. the corners of rectilinear or octagonal shapes, are not modified.
+
+  Args:
+      points (array of [x,y]): closed polygon loop, first point is not repeated at the end
+      tolerance (float): maximum deviation from the original boundary
+      use_arcs (bool, optional): fit circle arcs, False for decimated polyline. Defaults to True.
+      max_turn_angle (float, optional): maximum turn angle in degree at vertices of a run. Defaults to 30.
+      min_points (int, optional): minimum number of points in a run, including end points. Defaults to 5.
+      max_arc_angle (float, optional): maximum angle in degree of one fitted arc. Defaults to 120.
+
+  Returns:
+      points (array of [x,y]): remaining polygon points
+      centers (array of [x,y]): for each edge from points[k] to points[k+1], the arc center or NaN for a straight line
+  """
+  points = np.asarray(points, dtype=float)
+  numpoints = len(points)
+  centers = np.full((numpoints,2), np.nan)
+  if (tolerance <= 0) or (numpoints < min_points):
+    return points, centers
+
+  # signed turn angle at each vertex
+  d_prev = points - np.roll(points, 1, axis=0)
+  d_next = np.roll(points, -1, axis=0) - points
+  turn = np.arctan2(d_prev[:,0]*d_next[:,1] - d_prev[:,1]*d_next[:,0], d_prev[:,0]*d_next[:,0] + d_prev[:,1]*d_next[:,1])
+  curved = (np.abs(turn) > 1e-9) & (np.abs(turn) <= np.radians(max_turn_angle))
+  direction = np.where(curved, np.sign(turn), 0)
+  continued = curved & (direction == np.roll(direction, 1))
+
+  # runs of curved vertices, each run is extended by the neighbour vertex at both ends
+  if np.all(continued):
+    # polygonised circle: one closed run
+    runs = [np.append(np.arange(numpoints), 0)]
+  else:
+    first = int(np.flatnonzero(~continued)[0])
+    order = np.roll(np.arange(numpoints), -first)
+    runs = []
+    start = None
+    for position, index in enumerate(order):
+      if curved[index] and not continued[index]:
+        start = position
+      if (start is not None) and not continued[order[(position+1) % numpoints]]:
+        # include vertex before the run, unless that is already the end point of a run with other direction
+        if not curved[order[start-1]]:
+          start = start - 1
+        run = order[np.arange(start, position+2) % numpoints]
+        runs.append(run)
+        start = None
+
+  keep = np.ones(numpoints, dtype=bool)
+  for run in runs:
+    if len(run) < min_points:
+      continue
+    run_points = points[run]
+    keep[run[1:-1]] = False
+    if use_arcs:
+      # greedy: extend each arc as far as possible, straight line if no arc fits
+      start = 0
+      while start < len(run) - 1:
+        end = start + 1
+        center = None
+        while end + 1 < len(run):
+          candidate = get_arc_center(run_points[start:end+2], tolerance, np.radians(max_arc_angle))
+          if candidate is None:
+            break
+          end = end + 1
+          center = candidate
+        keep[run[start]] = True
+        if center is not None:
+          centers[run[start]] = center
+        start = end
+    else:
+      keep[run[decimate_polyline(run_points, tolerance)]] = True
+
+  if np.sum(keep) < 3:
+    # tolerance too large for this polygon
+    return points, np.full((numpoints,2), np.nan)
+  return points[keep], centers[keep]
+
+
+def is_collinear_vertex (previous, point, following, tolerance=1e-9):
+  """Check if point is on the straight line from previous to following point, between these points
+
+  Args:
+      previous (tuple of float): previous vertex (x,y)
+      point (tuple of float): vertex to check (x,y)
+      following (tuple of float): next vertex (x,y)
+      tolerance (float, optional): relative tolerance for cross product. Defaults to 1e-9.
+
+  Returns:
+      bool: True if vertex can be removed without changing the polygon
+  """
+  dx1 = point[0] - previous[0]
+  dy1 = point[1] - previous[1]
+  dx2 = following[0] - point[0]
+  dy2 = following[1] - point[1]
+  cross = dx1*dy2 - dy1*dx2
+  dot = dx1*dx2 + dy1*dy2
+  return (dot > 0) and (abs(cross) <= tolerance * (dx1*dx1 + dy1*dy1 + dx2*dx2 + dy2*dy2))
+
+
+def split_keyhole_polygon (polypoints):
+  """Decompose a keyhole polygon (cutouts connected to the outer boundary by a cut line, with duplicate vertices)
+  into one outer loop and hole loops. Cut lines are edges that are traversed in both directions, these are removed
+  and the remaining edges are chained to closed loops.
+
+  Args:
+      polypoints (array of [x,y]): polygon points
+
+  Returns:
+      list of array: outer loop first, then hole loops with the same orientation as the outer loop (required by gmsh addPlaneSurface). 
+                     None if polygon can not be decomposed into outer loop with holes.
+  """
+  pts = np.asarray(polypoints, dtype=float)
+  if len(pts) > 1 and np.all(pts[0] == pts[-1]):
+    pts = pts[:-1]
+  keys = [tuple(p) for p in pts.tolist()]
+  n = len(keys)
+
+  # directed edges, skip zero length edges
+  edges = [(keys[i], keys[(i+1)%n]) for i in range(n) if keys[i] != keys[(i+1)%n]]
+
+  # cut lines can partially overlap with collinear edges at the duplicate vertex:
+  # split edges at the duplicate vertices at endpoints of other edges that lie on them
+  seen = set()
+  duplicates = set()
+  for key in keys:
+    if key in seen:
+      duplicates.add(key)
+    seen.add(key)
+  touching = [edge for edge in edges if (edge[0] in duplicates) or (edge[1] in duplicates)]
+  split_points = set(p for edge in touching for p in edge)
+  split_edges = []
+  for edge in edges:
+    if (edge[0] in duplicates) or (edge[1] in duplicates):
+      (x0, y0), (x1, y1) = edge
+      dx = x1 - x0
+      dy = y1 - y0
+      length2 = dx*dx + dy*dy
+      inner = []
+      for (px, py) in split_points:
+        t = ((px-x0)*dx + (py-y0)*dy) / length2
+        cross = (px-x0)*dy - (py-y0)*dx
+        if (0 < t < 1) and (abs(cross) <= 1e-9 * length2):
+          inner.append((t, (px, py)))
+      if len(inner) > 0:
+        chain = [edge[0]] + [p for t, p in sorted(inner)] + [edge[1]]
+        split_edges.extend(zip(chain[:-1], chain[1:]))
+        continue
+    split_edges.append(edge)
+  edges = split_edges
+
+  # remove cut lines: each edge that also exists in reverse direction is removed together with its reverse
+  edge_count = {}
+  for edge in edges:
+    edge_count[edge] = edge_count.get(edge, 0) + 1
+  to_remove = {}
+  for edge, count in edge_count.items():
+    reverse_count = edge_count.get((edge[1], edge[0]), 0)
+    if reverse_count > 0:
+      to_remove[edge] = min(count, reverse_count)
+  remaining = []
+  for edge in edges:
+    if to_remove.get(edge, 0) > 0:
+      to_remove[edge] = to_remove[edge] - 1
+    else:
+      remaining.append(edge)
+
+  # chain remaining edges to closed loops
+  outgoing = {}
+  for i, edge in enumerate(remaining):
+    outgoing.setdefault(edge[0], []).append(i)
+  used = [False] * len(remaining)
+  loops = []
+  for i in range(len(remaining)):
+    if used[i]:
+      continue
+    loop = []
+    j = i
+    while True:
+      used[j] = True
+      loop.append(remaining[j][0])
+      end = remaining[j][1]
+      if end == loop[0]:
+        break
+      candidates = [k for k in outgoing.get(end, []) if not used[k]]
+      if len(candidates) == 0:
+        return None  # open chain, no valid decomposition
+      j = candidates[0]
+    # cut line endpoints on the outer loop or hole are collinear vertices now, remove them
+    loop = [p for k, p in enumerate(loop) if not ((p in split_points) and is_collinear_vertex(loop[k-1], p, loop[(k+1)%len(loop)]))]
+    if (len(loop) < 3) or (len(set(loop)) < len(loop)):
+      return None
+    loops.append(np.array(loop))
+
+  if len(loops) == 0:
+    return None
+
+  # outer loop is the one with largest area, holes must be inside and have opposite orientation
+  areas = [polygon_area(loop) for loop in loops]
+  outer_index = int(np.argmax(np.abs(areas)))
+  outer = loops[outer_index]
+  outer_min = np.min(outer, axis=0)
+  outer_max = np.max(outer, axis=0)
+  holes = []
+  for i, loop in enumerate(loops):
+    if i == outer_index:
+      continue
+    if np.sign(areas[i]) == np.sign(areas[outer_index]):
+      return None
+    if np.any(np.min(loop, axis=0) < outer_min) or np.any(np.max(loop, axis=0) > outer_max):
+      return None
+    # gmsh (OCC) adds the area of hole loops with opposite orientation instead of subtracting it
+    holes.append(loop[::-1])
+  return [outer] + holes
+
+
+def preprocess_cell (cell, layers, purposes, keep_holes=False):
+  """Used internally in processing data from gdspy: fracture polygons with cutouts (duplicate vertices) in one cell. 
+  All affected polygons are fractured in one batch and removed from the cell in one pass.
+
+  Args:
+      cell (gdspy.Cell): cell to process, modified in place
+      layers (set of int): GDSII layer numbers to process
+      purposes (list of int): GDSII data types to process
+      keep_holes (bool, optional): Keep polygons that can be decomposed into outer loop and holes, fracture only the others. Defaults to False.
+
+  Returns:
+      int: number of polygons that were fractured
+  """
+  # collect candidate polygons on requested layers, remember the PolygonSet they belong to
+  candidates = []
+  for element in cell.polygons:
+    for polypoints, layer, purpose in zip(element.polygons, element.layers, element.datatypes):
+      if (layer in layers) and (purpose in purposes):
+        candidates.append((element, polypoints, layer, purpose))
+
+  if len(candidates) == 0:
+    return 0
+
+  dupefound = find_duplicate_vertices([candidate[1] for candidate in candidates])
+  if not np.any(dupefound):
+    return 0
+
+  # fracture all affected polygons in one batch, fracture() keeps layer and datatype per polygon
+  affected = [candidates[i] for i in np.flatnonzero(dupefound)]
+  if keep_holes:
+    # polygons with valid outer loop and holes are kept as they are, these are split into curve loops in gmsh later
+    affected = [candidate for candidate in affected if split_keyhole_polygon(candidate[1]) is None]
+    if len(affected) == 0:
+      return 0
+  fractured = gdspy.PolygonSet([candidate[1] for candidate in affected])
+  fractured.layers    = [candidate[2] for candidate in affected]
+  fractured.datatypes = [candidate[3] for candidate in affected]
+  fractured.fracture(max_points=6)
+
+  # remove original polygons in one pass over the cell
+  affected_ids = set(id(candidate[1]) for candidate in affected)
+  filtered_polys = []
+  for element in cell.polygons:
+    keep = [(polypoints, layer, purpose) for polypoints, layer, purpose in zip(element.polygons, element.layers, element.datatypes) 
+            if id(polypoints) not in affected_ids]
+    if len(keep) == len(element.polygons):
+      filtered_polys.append(element)
+    elif len(keep) > 0:
+      element.polygons, element.layers, element.datatypes = [list(x) for x in zip(*keep)]
+      filtered_polys.append(element)
+  cell.polygons = filtered_polys
+
+  # add fractured polygons to cell
+  cell.add(fractured)
+  return len(affected)
+
+
+def get_window_after_transform (window, mirror=False, offset_x=0, offset_y=0):
+  """Apply optional mirror and offset of read_gds() to window
+
+  Args:
+      window (tuple): (xmin, ymin, xmax, ymax) in GDSII cell coordinates
+      mirror (bool, optional): Mirror the geometry about the y-axis. Defaults to False.
+      offset_x (float, optional): Geometry offset in x direction. Defaults to 0.
+      offset_y (float, optional): Geometry offset in y direction. Defaults to 0.
+
+  Returns:
+      tuple: (xmin, ymin, xmax, ymax) in output coordinates
+  """
+  xmin, ymin, xmax, ymax = window
+  if mirror:
+    xmin, xmax = -xmax, -xmin
+  return (xmin + offset_x, ymin + offset_y, xmax + offset_x, ymax + offset_y)
+
+
+def clip_polygons_to_window (polygons, window, clip=True):
+  """Used internally in processing data from gdspy: remove polygons outside window and optionally clip polygons at window edge.
+  Polygons are culled by bounding box, only polygons that cross the window edge are clipped.
+
+  Args:
+      polygons (list of array): list of polygons, each polygon is an array [[x1,y1],[x2,y2],...[xn,yn]]
+      window (tuple): (xmin, ymin, xmax, ymax)
+      clip (bool, optional): Clip polygons at window edge, otherwise polygons that cross the edge are kept unchanged. Defaults to True.
+
+  Returns:
+      list of array: polygons inside window
+  """
+  if len(polygons) == 0:
+    return polygons
+  xmin, ymin, xmax, ymax = window
+  counts = np.array([len(polypoints) for polypoints in polygons])
+  coords = np.concatenate(polygons)
+  offsets = np.concatenate(([0], np.cumsum(counts)))[:-1]
+  poly_xmin = np.minimum.reduceat(coords[:,0], offsets)
+  poly_ymin = np.minimum.reduceat(coords[:,1], offsets)
+  poly_xmax = np.maximum.reduceat(coords[:,0], offsets)
+  poly_ymax = np.maximum.reduceat(coords[:,1], offsets)
+
+  overlap = (poly_xmax > xmin) & (poly_xmin < xmax) & (poly_ymax > ymin) & (poly_ymin < ymax)
+  inside = (poly_xmin >= xmin) & (poly_xmax <= xmax) & (poly_ymin >= ymin) & (poly_ymax <= ymax)
+  if not clip:
+    return [polygons[n] for n in np.flatnonzero(overlap)]
+
+  result = [polygons[n] for n in np.flatnonzero(inside)]
+  window_rectangle = gdspy.Rectangle((xmin, ymin), (xmax, ymax))
+  for n in np.flatnonzero(overlap & ~inside):
+    clipped = gdspy.boolean([polygons[n]], window_rectangle, 'and')
+    if clipped is not None:
+      result.extend(clipped.polygons)
+  return result
+
+
+def window_overlaps (bbox, window):
+  """Check if bounding box overlaps window
+
+  Args:
+      bbox (array): [[xmin, ymin], [xmax, ymax]] as returned by gdspy get_bounding_box(), can be None
+      window (tuple): (xmin, ymin, xmax, ymax)
+
+  Returns:
+      bool: True if bounding box overlaps window
+  """
+  if bbox is None:
+    return False
+  return (bbox[1][0] > window[0]) and (bbox[0][0] < window[2]) and (bbox[1][1] > window[1]) and (bbox[0][1] < window[3])
+
+
+def get_polygons_by_layer (LPPpolylist):
+  """Used internally in processing data from gdspy: group polygons by layer number, so that wanted layers can be found by dictionary lookup
+
+  Args:
+      LPPpolylist (dict): polygons from gdspy get_polygons(by_spec=True), key is (layer, datatype)
+
+  Returns:
+      dict: key is layer number, value is list of (datatype, polygons) 
+  """
+  polygons_by_layer = {}
+  for (layer, purpose), polygons in LPPpolylist.items():
+    polygons_by_layer.setdefault(layer, []).append((purpose, polygons))
+  return polygons_by_layer
+
+
+
+# ---------------------- hierarchical extraction --------------------
+
+def get_reference_transform (reference):
+  """Affine transformation of a gdspy CellReference or CellArray, same order of operations as in gdspy
+
+  Args:
+      reference (gdspy.CellReference or gdspy.CellArray): reference to evaluate
+
+  Returns:
+      matrix (2x2 array), translations (array of [x,y]): new points are points @ matrix.T + translation, one translation per array element
+  """
+  magnification = 1.0 if reference.magnification is None else float(reference.magnification)
+  reflection = np.diag([1.0, -1.0]) if reference.x_reflection else np.eye(2)
+  if reference.rotation is not None:
+    angle = reference.rotation * np.pi / 180.0
+    rotation = np.array([[np.cos(angle), -np.sin(angle)], [np.sin(angle), np.cos(angle)]])
+  else:
+    rotation = np.eye(2)
+  origin = np.zeros(2) if reference.origin is None else np.asarray(reference.origin, dtype=float)
+
+  if isinstance(reference, gdspy.CellArray):
+    # gdspy: magnification, then spacing offset, then reflection, rotation and origin
+    matrix = rotation @ reflection * magnification
+    ii, jj = np.meshgrid(np.arange(reference.columns), np.arange(reference.rows), indexing='ij')
+    spacing = np.column_stack((ii.ravel() * reference.spacing[0], jj.ravel() * reference.spacing[1]))
+    translations = spacing @ (rotation @ reflection).T + origin
+  else:
+    # gdspy: reflection, magnification, rotation, origin
+    matrix = rotation @ reflection * magnification
+    translations = origin.reshape(1,2)
+  return matrix, translations
+
+
+def get_merged_via_array (coords, counts, matrix, translations, maxspacing, scale=1.0):
+  """Analytic via array merging for a CellArray: if the array element has one rectangular via on this layer
+  and the gap between vias is below the via merge limit, the merged result is the enclosing rectangle of the array.
+  This gives the same result as merge_via_array(), without creating the individual vias.
+
+  Args:
+      coords (array of [x,y]): via polygon points in subcell coordinates
+      counts (array of int): number of vertices for each polygon
+      matrix (2x2 array): reference transformation matrix
+      translations (array of [x,y]): translation for each array element
+      maxspacing (float): merge_polygon_size value
+      scale (float, optional): magnification applied later by parent cells, via gaps are evaluated at final size. Defaults to 1.0.
+
+  Returns:
+      array of [x,y]: merged rectangle, None if analytic merging is not possible
+  """
+  if (maxspacing <= 0) or (len(counts) != 1):
+    return None
+  # array element must be an axis-aligned rectangle after transformation (rotation by multiples of 90 degree)
+  if len(np.unique(coords[:,0])) != 2 or len(np.unique(coords[:,1])) != 2 or len(coords) not in (4,5):
+    return None
+  if not (np.isclose(matrix[0,1], 0) and np.isclose(matrix[1,0], 0)) and not (np.isclose(matrix[0,0], 0) and np.isclose(matrix[1,1], 0)):
+    return None
+  corners = coords @ matrix.T
+  via_min = np.min(corners, axis=0)
+  via_max = np.max(corners, axis=0)
+  via_size = via_max - via_min
+
+  # array positions must be a regular grid with gaps below merge limit in both directions
+  merge_limit = 2 * get_via_merge_offset(maxspacing)
+  for axis in (0,1):
+    positions = np.unique(np.round(translations[:,axis], 9))
+    if len(positions) > 1:
+      steps = np.diff(positions)
+      if not np.allclose(steps, steps[0]):
+        return None
+      if (steps[0] - via_size[axis]) * scale >= merge_limit:
+        return None
+  if len(np.unique(np.round(translations, 9), axis=0)) != len(translations):
+    return None
+  # all array positions must be occupied, this is not the case if array elements were culled by window
+  if len(np.unique(np.round(translations[:,0], 9))) * len(np.unique(np.round(translations[:,1], 9))) != len(translations):
+    return None
+
+  xmin, ymin = via_min + np.min(translations, axis=0)
+  xmax, ymax = via_max + np.max(translations, axis=0)
+  return np.array([[xmin, ymin], [xmin, ymax], [xmax, ymax], [xmax, ymin]])
+
+
+def get_polygons_from_hierarchy (cell, layers, purposes, mirror=False, offset_x=0, offset_y=0, via_layers=set(), merge_polygon_size=0, window=None):
+  """Used internally in processing data from gdspy: get polygons of wanted layers from cell hierarchy without flattening.
+  Each cell is evaluated only once, including its subcells. Instances (also arrays) are created by one vectorized
+  affine transformation of the subcell coordinate arrays.
+
+  Args:
+      cell (gdspy.Cell): top cell
+      layers (set of int): GDSII layer numbers to extract
+      purposes (list of int): GDSII data types to extract
+      mirror (bool, optional): Mirror the geometry about the y-axis. Defaults to False.
+      offset_x (float, optional): Geometry offset in x direction. Defaults to 0.
+      offset_y (float, optional): Geometry offset in y direction. Defaults to 0.
+      via_layers (set of int, optional): GDSII layer numbers of via layers, arrays on these layers are merged analytically. Defaults to empty set.
+      merge_polygon_size (float, optional): Via merge limit, analytic via array merging is enabled when value is > 0. Defaults to 0.
+      window (tuple, optional): (xmin, ymin, xmax, ymax) in cell coordinates, instances outside are skipped with their complete subtree. 
+                                Polygons that are only partially inside must be clipped by the caller. Defaults to None (no window).
+
+  Returns:
+      dict: key is (layer, datatype), value is list of polygons, same as gdspy get_polygons(by_spec=True)
+  """
+  extracted = {}   # (cell name, scale, window) -> {(layer, datatype): (coords, counts)}
+
+  def extract (cell, scale, window):
+    # scale is the total magnification applied by parent cells, this is only relevant for analytic via merging
+    # window is the region of interest in coordinates of this cell, None if cell is completely inside
+    if (cell.name, scale, window) in extracted:
+      return extracted[(cell.name, scale, window)]
+
+    chunks = {}
+    def add (key, coords, counts):
+      chunks.setdefault(key, []).append((coords, counts))
+
+    # polygons and paths in this cell
+    for polyset in cell.polygons:
+      for polypoints, layer, purpose in zip(polyset.polygons, polyset.layers, polyset.datatypes):
+        if (layer in layers) and (purpose in purposes):
+          add((layer, purpose), np.asarray(polypoints, dtype=float), np.array([len(polypoints)]))
+    for path in cell.paths:
+      if any((layer in layers) and (purpose in purposes) for layer, purpose in zip(path.layers, path.datatypes)):
+        for key, path_polygons in path.get_polygons(True).items():
+          if (key[0] in layers) and (key[1] in purposes) and len(path_polygons) > 0:
+            add(key, np.concatenate(path_polygons), np.array([len(p) for p in path_polygons]))
+
+    # references: subcell data is extracted once, then transformed for all instances
+    for reference in cell.references:
+      if not isinstance(reference.ref_cell, gdspy.Cell):
+        continue
+      magnification = 1.0 if reference.magnification is None else float(reference.magnification)
+      matrix, translations = get_reference_transform(reference)
+      subcell_window = None
+      if window is not None:
+        # skip instances outside window, using bounding box of each instance
+        subcell_bbox = reference.ref_cell.get_bounding_box()
+        if subcell_bbox is None:
+          continue
+        corners = np.array([[x, y] for x in subcell_bbox[:,0] for y in subcell_bbox[:,1]]) @ matrix.T
+        instance_min = np.min(corners, axis=0) + translations
+        instance_max = np.max(corners, axis=0) + translations
+        window_min = np.array(window[:2])
+        window_max = np.array(window[2:])
+        overlap = np.all((instance_max > window_min) & (instance_min < window_max), axis=1)
+        translations = translations[overlap]
+        if len(translations) == 0:
+          continue
+        inside = np.all((instance_min[overlap] >= window_min) & (instance_max[overlap] <= window_max), axis=1)
+        if (len(translations) == 1) and not inside[0]:
+          # single instance crosses window edge: continue culling in subcell, with window in subcell coordinates
+          window_corners = (np.array([[x, y] for x in (window[0], window[2]) for y in (window[1], window[3])]) - translations[0]) @ np.linalg.inv(matrix).T
+          subcell_window = tuple(float(value) for value in np.concatenate((np.min(window_corners, axis=0), np.max(window_corners, axis=0))))
+      subcell_data = extract(reference.ref_cell, scale * magnification, subcell_window)
+      if len(subcell_data) == 0:
+        continue
+      for key, (coords, counts) in subcell_data.items():
+        if (key[0] in via_layers) and (len(translations) > 1):
+          # via arrays: create merged via region directly, without individual vias
+          merged = get_merged_via_array(coords, counts, matrix, translations, merge_polygon_size, scale)
+          if merged is not None:
+            add(key, merged, np.array([4]))
+            continue
+        transformed = (coords @ matrix.T)[np.newaxis,:,:] + translations[:,np.newaxis,:]
+        add(key, transformed.reshape(-1,2), np.tile(counts, len(translations)))
+
+    result = {}
+    for key, chunklist in chunks.items():
+      result[key] = (np.concatenate([chunk[0] for chunk in chunklist]), np.concatenate([chunk[1] for chunk in chunklist]))
+    extracted[(cell.name, scale, window)] = result
+    return result
+
+  LPPpolylist = {}
+  if window is not None:
+    window = tuple(float(value) for value in window)
+  for key, (coords, counts) in extract(cell, 1.0, window).items():
+    coords = coords.copy()
+    if mirror:
+      coords[:,0] = -coords[:,0]
+    coords = coords + np.array([offset_x, offset_y], dtype=float)
+    LPPpolylist[key] = np.split(coords, np.cumsum(counts)[:-1])
+  return LPPpolylist
+
+
+
+# ---------------------- cache for processed GDSII data --------------------
+
+GDS_CACHE_SUFFIX = '_gds_cache.npz'
+
+
+def get_gds_cache_key (filename, layerlist, purposelist, metals_list, preprocess, merge_polygon_size, mirror, offset_x, offset_y, gds_boundary_layers, layernumber_offset, keep_holes, hierarchical, via_merge_engine, cell_name, window, clip_window):
+  """Create cache key for read_gds(): hash over GDSII file content and all settings that change the result
+
+  Returns:
+      string: SHA-256 hash value as hex string
+  """
+  settings = {
+    'version': __version__,
+    'gds_sha256': utilities.calculate_sha256_of_file(filename),
+    'layers': [int(layer) for layer in layerlist],
+    'purposes': [int(purpose) for purpose in purposelist],
+    'via_layers': [int(metal.layernum) for metal in metals_list.metals if metal.is_via],
+    'preprocess': bool(preprocess),
+    'merge_polygon_size': float(merge_polygon_size),
+    'mirror': bool(mirror),
+    'offset_x': float(offset_x),
+    'offset_y': float(offset_y),
+    'boundary_layers': [int(layer) for layer in gds_boundary_layers],
+    'layernumber_offset': int(layernumber_offset),
+    'keep_holes': bool(keep_holes),
+    'hierarchical': bool(hierarchical),
+    'via_merge_engine': str(via_merge_engine),
+    'cell_name': cell_name,
+    'window': None if window is None else [float(value) for value in window],
+    'clip_window': bool(clip_window)
+  }
+  return hashlib.sha256(json.dumps(settings, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def save_gds_cache (cache_filename, all_polygons):
+  """Write polygon store and bounding boxes to compressed *.npz cache file
+
+  Args:
+      cache_filename (string): full filename of cache file
+      all_polygons (all_polygons_list): data to store
+  """
+  store = all_polygons.store
+  bbox = all_polygons.bounding_box
+  bbox_layers = list(bbox.bounding_boxes.keys())
+  bbox_values = [[bbox.bounding_boxes[layer].xmin, bbox.bounding_boxes[layer].xmax, 
+                  bbox.bounding_boxes[layer].ymin, bbox.bounding_boxes[layer].ymax] for layer in bbox_layers]
+  try:
+    os.makedirs(os.path.dirname(cache_filename), exist_ok=True)
+    # write to temporary file first, so that parallel runs never see incomplete cache files
+    temp_filename = cache_filename + '.' + str(os.getpid()) + '.tmp'
+    with open(temp_filename, 'wb') as f:
+      np.savez_compressed(f,
+                          coords=store.coords,
+                          counts=np.diff(store.offsets),
+                          layers=store.layers,
+                          is_port=store.is_port,
+                          is_via=store.is_via,
+                          bbox_layers=np.array(bbox_layers, dtype=np.int64),
+                          bbox_values=np.array(bbox_values, dtype=float).reshape(-1,4),
+                          bbox_global=np.array([bbox.xmin, bbox.xmax, bbox.ymin, bbox.ymax], dtype=float))
+    os.replace(temp_filename, cache_filename)
+  except OSError as e:
+    print('[WARNING] Could not write GDSII cache file ', cache_filename, ': ', e)
+
+
+def load_gds_cache (cache_filename):
+  """Read polygon store and bounding boxes from *.npz cache file
+
+  Args:
+      cache_filename (string): full filename of cache file
+
+  Returns:
+      all_polygons_list: data from cache, None if cache file does not exist or is invalid
+  """
+  if not os.path.isfile(cache_filename):
+    return None
+  try:
+    with np.load(cache_filename) as data:
+      all_polygons = all_polygons_list()
+      all_polygons.store.append_arrays(data['coords'], data['counts'], data['layers'], data['is_port'], data['is_via'])
+      for layer, values in zip(data['bbox_layers'], data['bbox_values']):
+        all_polygons.bounding_box.update(int(layer), values[0], values[1], values[2], values[3])
+      xmin, xmax, ymin, ymax = data['bbox_global']
+      all_polygons.set_bounding_box(xmin, xmax, ymin, ymax)
+  except (OSError, KeyError, ValueError) as e:
+    print('[WARNING] Ignoring invalid GDSII cache file ', cache_filename, ': ', e)
+    return None
+  # mark as recently used, for eviction
+  os.utime(cache_filename)
+  return all_polygons
+
+
+def evict_gds_cache (cache_path, max_size_mb=500, max_age_days=30):
+  """Remove old GDSII cache files: files not used for max_age_days, then least recently used files until total size is below max_size_mb 
+
+  Args:
+      cache_path (string): directory with cache files
+      max_size_mb (float, optional): maximum total size of cache files. Defaults to 500.
+      max_age_days (float, optional): maximum age since last use. Defaults to 30.
+  """
+  cache_files = []
+  for name in os.listdir(cache_path):
+    if name.endswith(GDS_CACHE_SUFFIX):
+      fullname = os.path.join(cache_path, name)
+      stat = os.stat(fullname)
+      cache_files.append((stat.st_mtime, stat.st_size, fullname))
+
+  # least recently used first
+  cache_files.sort()
+  now = time.time()
+  total_size = sum(entry[1] for entry in cache_files)
+  for mtime, size, fullname in cache_files:
+    too_old = (now - mtime) > max_age_days*86400
+    too_large = total_size > max_size_mb*1e6
+    if too_old or too_large:
+      try:
+        os.remove(fullname)
+        total_size = total_size - size
+      except OSError:
+        pass
+
+
+
 # ----------- read GDSII file, return openEMS polygon list object -----------
 
-def read_gds(filename, layerlist, purposelist, metals_list, preprocess=False, merge_polygon_size=0, mirror=False, offset_x=0, offset_y=0, gds_boundary_layers=[], layernumber_offset=0):
+def read_gds(filename, layerlist, purposelist, metals_list, preprocess=False, merge_polygon_size=0, mirror=False, offset_x=0, offset_y=0, gds_boundary_layers=[], layernumber_offset=0, keep_holes=False, cache_path=None, hierarchical=False, via_merge_engine='grid', via_merge_workers=1, gds_backend='gdspy', cell_name=None, window=None, clip_window=True):
   """
   Read GDSII file and return polygon list object.
 
@@ -388,107 +2479,152 @@ def read_gds(filename, layerlist, purposelist, metals_list, preprocess=False, me
       offset_y (float, optional): Geometry offset in y direction. Defaults to 0.
       gds_boundary_layers (list of int, optional): List of extra layers to evaluate for finite dielectric size. Defaults to [].
       layernumber_offset (int, optional): Optional offset applied to GDSII layer numbers to avoid duplicates when reading multiple files. Defaults to 0.
+      keep_holes (bool, optional): In preprocessing, keep polygons with cutouts as one surface with holes instead of fracturing them. Defaults to False.
+      cache_path (str, optional): Directory for cached results, e.g. simulation data directory. Processed data is stored there and re-used if GDSII file and settings are unchanged. Defaults to None (no cache).
+      hierarchical (bool, optional): Extract geometry by walking the cell hierarchy instead of flattening the top cell. Each cell is evaluated only once, instances are created by coordinate transformation.
+                                     With via array merging enabled, arrays of vias are merged analytically without creating the individual vias. Defaults to False.
+      via_merge_engine (str, optional): Via array merging method, 'grid' for fast clustering of rectangular vias with fallback to 'boolean' for other shapes,
+                                        'boolean' for offset/boolean/offset on all vias. Defaults to 'grid'.
+      via_merge_workers (int, optional): Number of processes for via array merging, via layers are merged in parallel. 0 to use all CPU cores. Defaults to 1.
+      gds_backend (str, optional): 'gdspy' to read the complete GDSII library with gdspy, 'stream' to read only the top cell hierarchy and wanted layers
+                                   from memory-mapped file, for less memory and time with large GDSII files. Defaults to 'gdspy'.
+      cell_name (str, optional): Name of GDSII cell to evaluate, e.g. one block from a full chip layout. Only this cell and the cells below are preprocessed and extracted,
+                                 with gds_backend='stream' other cells are not even read from file. Defaults to None (top level cell).
+      window (tuple, optional): Region of interest (xmin, ymin, xmax, ymax) in GDSII cell coordinates, before mirror and offset. Only geometry inside is extracted,
+                                cell instances outside are skipped. Bounding boxes for dielectric and air box are then based on this region. Defaults to None (complete cell).
+      clip_window (bool, optional): Clip polygons at window edge. Otherwise, polygons that are partially inside the window are kept unchanged. Defaults to True.
 
   Returns:
       all_polygons_list: All polygon information data.
   """
   
+  if via_merge_engine not in ('grid', 'boolean'):
+    print('Invalid via_merge_engine, valid values are grid or boolean: ', via_merge_engine)
+    exit(1)
+  if gds_backend not in ('gdspy', 'stream'):
+    print('Invalid gds_backend, valid values are gdspy or stream: ', gds_backend)
+    exit(1)
+
   if os.path.isfile(filename):
     print('Reading GDSII input file:', filename)
+
+    # optional cache for processed data, key is calculated from file content and all settings
+    cache_filename = None
+    if cache_path is not None:
+      cache_key = get_gds_cache_key(filename, layerlist, purposelist, metals_list, preprocess, merge_polygon_size, mirror, 
+                                    offset_x, offset_y, gds_boundary_layers, layernumber_offset, keep_holes, hierarchical, via_merge_engine, cell_name, window, clip_window)
+      cache_filename = os.path.join(cache_path, utilities.get_basename(filename) + '_' + cache_key[:16] + GDS_CACHE_SUFFIX)
+      all_polygons = load_gds_cache(cache_filename)
+      if all_polygons is not None:
+        print('Using cached GDSII data:', cache_filename)
+        # same modification of layerlist as without cache, see below
+        layerlist.extend(gds_boundary_layers)
+        return all_polygons
   
-    input_library = gdspy.GdsLibrary(infile=filename)
+    if gds_backend == 'stream':
+      # read only what we need: cells below top cell, polygons and paths on layers to extract
+      t_start = time.perf_counter()
+      stream_layers = set(layer - layernumber_offset for layer in layerlist + gds_boundary_layers)
+      input_library = gds_stream.read_library(filename, stream_layers, purposelist, cell_name)
+      print(f'  Read {len(input_library.cells)} cells with streaming reader in {time.perf_counter()-t_start:.3f} s')
+    else:
+      input_library = gdspy.GdsLibrary(infile=filename)
+
+    if cell_name is not None:
+      # evaluate cell selected by user
+      if cell_name not in input_library.cells:
+        print('Cell ', cell_name, ' not found in GDSII file ', filename)
+        exit(1)
+      cell = input_library.cells[cell_name]
+    else:
+      # evaluate only first top level cell
+      toplevel_cell_list = input_library.top_level()
+      cell = toplevel_cell_list[0]
+    print('Using GDSII cell:', cell.name)
 
     if preprocess: 
       print('Pre-processing GDSII to handle cutouts and self-intersecting polygons')
-      # iterate over cells
-      for cell in input_library:
-        
-        # iterate over polygons
-        for poly in cell.polygons:
-          
-          # points of this polygon
-          polypoints = poly.polygons[0]
-
-          poly_layer = poly.layers[0]
-          poly_purpose = poly.datatypes[0]
-
-          if ((poly_layer in layerlist) and (poly_purpose in purposelist)):
-          
-            # get number of vertices
-            numvertices = len(polypoints) 
-            
-            seen   = set()    # already seen vertex values
-            dupefound = False
-
-            # iterate over vertices to find duplicates
-            for i_vertex in range(numvertices):
-              
-              # print('polypoints  = ' + str(polypoints))
-              x = polypoints[i_vertex][0]
-              y = polypoints[i_vertex][1]
-              
-              # create string representation so that we can check for duplicates
-              vertex_string = str(x)+','+str(y)
-              if vertex_string in seen:
-                dupefound = True
-                # print('      found duplicate at vertex ' + str(i_vertex) + ': ' + vertex_string)
-              else:
-                seen.add(vertex_string)  
-
-            if dupefound:
-                          
-              # do the slicing
-              
-              # convert polygon to format required for slicing
-              basepoly_points = []
-
-              for i_vertex in range(numvertices):
-                basepoly_points.append((polypoints[i_vertex,0], polypoints[i_vertex,1]))
-
-              # create new polygon
-              basepoly = gdspy.Polygon(basepoly_points, layer=poly_layer, datatype=poly_purpose)  
-              fractured = basepoly.fracture(max_points=6)
-
-              # add fractured polygon to cell
-              cell.add(fractured)
-
-              # invalidate original polygon
-              poly.layers=[0]
-              # remove original polygon
-              cell.remove_polygons(lambda pts, layer, datatype:
-                layer == 0)
+      # layer list has layer numbers with offset, GDSII has base layer numbers
+      preprocess_layers = set(layer - layernumber_offset for layer in layerlist)
+      t_start = time.perf_counter()
+      numfractured = 0
+      # iterate over cells in hierarchy below evaluated cell, other cells are not used
+      for subcell in [cell] + list(cell.get_dependencies(recursive=True)):
+        numfractured = numfractured + preprocess_cell(subcell, preprocess_layers, purposelist, keep_holes)
+      print(f'  Fractured {numfractured} polygons with cutouts in {time.perf_counter()-t_start:.3f} s')
     
     # end preprocessing
 
-    # evaluate only first top level cell
-    toplevel_cell_list = input_library.top_level()
-    cell = toplevel_cell_list[0]
-
     all_polygons = all_polygons_list()
 
-    # flatten hierarchy below this cell
-    cell.flatten(single_layer=None, single_datatype=None, single_texttype=None)
-
-    # optional mirror and translation of entire cell
-    for poly in cell.polygons:
-      if mirror:
-        # optional mirror
-        poly = poly.mirror(p1=[0,0],p2=[0,1])
-      if (offset_x != 0) or (offset_y != 0):
-        # optional translation after mirror
-        poly = poly.translate(offset_x, offset_y)
-
-
     # iterate over XML technology metal layers and (optional) dielectric layer boundary spec
     extended_layer_list = layerlist
     extended_layer_list.extend(gds_boundary_layers)
 
+    t_start = time.perf_counter()
+    if hierarchical:
+      # walk the reference tree, extract wanted layers from each cell only once
+      # and apply instance transformations to the coordinate arrays
+      wanted_layers = set(layer - layernumber_offset for layer in extended_layer_list)
+      via_layers = set(int(metal.layernum) - layernumber_offset for metal in metals_list.metals if metal.is_via)
+      LPPpolylist = get_polygons_from_hierarchy(cell, wanted_layers, purposelist, mirror, offset_x, offset_y, via_layers, merge_polygon_size, window)
+    else:
+      if window is not None:
+        # skip instances outside window before flattening
+        cell.references = [reference for reference in cell.references if window_overlaps(reference.get_bounding_box(), window)]
+
+      # flatten hierarchy below this cell
+      cell.flatten(single_layer=None, single_datatype=None, single_texttype=None)
+
+      # optional mirror and translation of entire cell
+      for poly in cell.polygons:
+        if mirror:
+          # optional mirror
+          poly = poly.mirror(p1=[0,0],p2=[0,1])
+        if (offset_x != 0) or (offset_y != 0):
+          # optional translation after mirror
+          poly = poly.translate(offset_x, offset_y)
+
+      # do not descend into cell references (depth=0), cell is flat already
+      LPPpolylist = cell.get_polygons(by_spec=True, depth=0)
+
+    if window is not None:
+      # remove polygons outside window, before via array merging
+      output_window = get_window_after_transform(window, mirror, offset_x, offset_y)
+      for key in list(LPPpolylist.keys()):
+        LPPpolylist[key] = clip_polygons_to_window(LPPpolylist[key], output_window, clip_window)
+        if len(LPPpolylist[key]) == 0:
+          del LPPpolylist[key]
+      if len(LPPpolylist) == 0:
+        print('WARNING: No polygons found inside window ', window)
+
+    # bucket all polygons of the cell by layer and purpose, this walks the polygons only once
+    polygons_by_layer = get_polygons_by_layer(LPPpolylist)
+    print(f'Extracting polygons by layer and purpose: {time.perf_counter()-t_start:.3f} s')
+
+    # optional via array merging, only for via layers
+    # via layers are independent, so all of them are merged in one step that can run in parallel processes
+    merged_via_layers = {}
+    if merge_polygon_size > 0:
+      via_layer_polygons = {}
+      for layer_to_extract in extended_layer_list:
+        metal = metals_list.getbylayernumber(layer_to_extract) # this is the layer number with offset, to match XML stackup
+        if (metal != None) and metal.is_via:
+          for purpose, layerpolygons in polygons_by_layer.get(layer_to_extract - layernumber_offset, []):
+            if purpose in purposelist and len(layerpolygons) > 0:
+              via_layer_polygons[(layer_to_extract, purpose)] = layerpolygons
+      if len(via_layer_polygons) > 0:
+        t_start = time.perf_counter()
+        merged_via_layers = merge_via_layers(via_layer_polygons, merge_polygon_size, via_merge_engine, via_merge_workers)
+        print(f'  Merged via arrays on {len(via_layer_polygons)} layers in {time.perf_counter()-t_start:.3f} s')
+
+    evaluated_layers = set()  # layer can appear more than once in list, e.g. when used as boundary and metal
+
     for layer_to_extract in extended_layer_list:
       
-      # print ("Evaluating layer ", str(layer_to_extract))
-
-      # get layers used in cell
-      used_layers = cell.get_layers()
+      if layer_to_extract in evaluated_layers:
+        continue
+      evaluated_layers.add(layer_to_extract)
 
       # Note on layer numbers:
       # Used layer is the layer base number, layer_to_extract has the layer number offset from XML
@@ -496,31 +2632,18 @@ def read_gds(filename, layerlist, purposelist, metals_list, preprocess=False, me
 
       # check if layer-to-extract is used in cell 
       layer_to_extract_gds = layer_to_extract - layernumber_offset
-      if (layer_to_extract_gds in used_layers):  # use base layer number here to match GDSII
-              
-        # iterate over layer-purpose pairs (by_spec=true)
-        # do not descend into cell references (depth=0)
-        LPPpolylist = cell.get_polygons(by_spec=True, depth=0)
+      if layer_to_extract_gds in polygons_by_layer:  # use base layer number here to match GDSII
+        t_start = time.perf_counter()
+        numpoly_layer = 0
 
-        for LPP in LPPpolylist:
-          layer = LPP[0]   
-          purpose = LPP[1]
+        # iterate over purposes found on this layer
+        for purpose, layerpolygons in polygons_by_layer[layer_to_extract_gds]:
           
           # now get polygons for this one layer-purpose-pair
-          if (layer==layer_to_extract_gds) and (purpose in purposelist):
-            layerpolygons = LPPpolylist[(layer, purpose)]
-
-            # optional via array merging, only for via layers
-            metal = metals_list.getbylayernumber(layer_to_extract) # this is the layer number with offset, to match XML stackup
-            if metal != None:
-              if (merge_polygon_size>0) and metal.is_via:
-                layerpolygons = merge_via_array (layerpolygons, merge_polygon_size)
+          if purpose in purposelist:
 
-            # bounding box for this layer
-            xmin=float('inf')
-            ymin=float('inf')
-            xmax=float('-inf')
-            ymax=float('-inf')
+            # use result from via array merging, if any
+            layerpolygons = merged_via_layers.get((layer_to_extract, purpose), layerpolygons)
 
             # Issue warning when very many polygons on layer
             numpoly = len(layerpolygons)
@@ -528,32 +2651,11 @@ def read_gds(filename, layerlist, purposelist, metals_list, preprocess=False, me
               print(f'Layer {layer_to_extract} has {numpoly} polygons')
               print(' ==> Consider via array merging by setting merge_polygon_size > 0')
 
-            # iterate over layer polygons
-            for polypoints in layerpolygons:
-
-              numvertices = int(polypoints.size/polypoints.ndim)
-
-              # new polygon, store layer number information
-              new_poly = gds_polygon(layer + layernumber_offset)
-
-              # get vertices
-              for vertex in range(numvertices):
-                x = polypoints[vertex,0]
-                y = polypoints[vertex,1]
+            # add all polygons of this layer at once, this also updates the bounding box for this layer
+            all_polygons.add_layer_polygons(layerpolygons, layer_to_extract)
+            numpoly_layer = numpoly_layer + numpoly
 
-                new_poly.add_vertex(x,y)
-                
-                # update bounding box information
-                xmin = min(x,xmin)
-                xmax = max(x,xmax)
-                ymin = min(y,ymin)
-                ymax = max(y,ymax)
-              
-              # polygon is complete, process and add to list
-              all_polygons.append(new_poly)
-
-              # done with this layer, store bounding box for this layer    
-              all_polygons.bounding_box.update(layer + layernumber_offset, xmin, xmax, ymin, ymax)
+        print(f'  Layer {layer_to_extract}: {numpoly_layer} polygons extracted in {time.perf_counter()-t_start:.3f} s')
 
     '''
     # Re-evaluate bounding box if we have a bounding box specified in GDS file and evaluation is requested
@@ -607,6 +2709,10 @@ def read_gds(filename, layerlist, purposelist, metals_list, preprocess=False, me
 
 
     # all_polygons.set_bounding_box (xmin,xmax,ymin,ymax)
+
+    if cache_filename is not None:
+      save_gds_cache(cache_filename, all_polygons)
+      evict_gds_cache(cache_path)
     
     # done!
     return all_polygons
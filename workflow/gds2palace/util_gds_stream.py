@@ -0,0 +1,295 @@
+########################################################################
+#
+# Copyright 2025 Volker Muehlhaus and IHP PDK Authors
+#
+# Licensed under the GNU General Public License, Version 3.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    https://www.gnu.org/licenses/gpl-3.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+########################################################################
+
+# Streaming GDSII reader: read only cells and layers that we need into gdspy library
+
+__version__ = "1.0.0"
+
+import gdspy
+import gdspy.library
+import numpy as np
+import mmap
+import struct
+
+# GDSII record types used here
+UNITS    = 0x03
+ENDLIB   = 0x04
+BGNSTR   = 0x05
+STRNAME  = 0x06
+ENDSTR   = 0x07
+BOUNDARY = 0x08
+PATH     = 0x09
+SREF     = 0x0A
+AREF     = 0x0B
+TEXT     = 0x0C
+LAYER    = 0x0D
+DATATYPE = 0x0E
+WIDTH    = 0x0F
+XY       = 0x10
+ENDEL    = 0x11
+SNAME    = 0x12
+COLROW   = 0x13
+NODE     = 0x15
+STRANS   = 0x1A
+MAG      = 0x1B
+ANGLE    = 0x1C
+PATHTYPE = 0x21
+BOX      = 0x2D
+BOXTYPE  = 0x2E
+BGNEXTN  = 0x30
+ENDEXTN  = 0x31
+
+HEADER_FORMAT = struct.Struct('>HBB')  # record size, record type, data type
+
+
+def get_string (data, pos, size):
+  """Get ASCII string from record data, padding zero is removed
+
+  Args:
+      data (mmap): GDSII file data
+      pos (int): start of record, including 4 byte header
+      size (int): record size, including 4 byte header
+
+  Returns:
+      string: record value
+  """
+  value = data[pos+4:pos+size]
+  if value[-1:] == b'\0':
+    value = value[:-1]
+  return value.decode('ascii')
+
+
+def get_real (data, pos):
+  """Get first 8 byte real value from record data, same conversion as in gdspy
+
+  Args:
+      data (mmap): GDSII file data
+      pos (int): start of record, including 4 byte header
+
+  Returns:
+      float: record value
+  """
+  return gdspy.library._eight_byte_real_to_float(data[pos+4:pos+12])
+
+
+def index_structures (data):
+  """First pass over GDSII data: find byte range of each structure (cell) and the cells that it references.
+  Only record headers are evaluated, except for names and units.
+
+  Args:
+      data (mmap): GDSII file data
+
+  Returns:
+      factor (float): user units per database unit
+      structures (dict): key is cell name, value is (start, end, set of referenced cell names), in file order
+  """
+  factor = 1
+  structures = {}
+  name = None
+  start = 0
+  references = set()
+  pos = 0
+  size_total = len(data)
+  while pos + 4 <= size_total:
+    size, record_type, data_type = HEADER_FORMAT.unpack_from(data, pos)
+    if size < 4:
+      # padding after end of library
+      break
+    if record_type == SNAME:
+      references.add(get_string(data, pos, size))
+    elif record_type == BGNSTR:
+      start = pos
+      references = set()
+    elif record_type == STRNAME:
+      name = get_string(data, pos, size)
+    elif record_type == ENDSTR:
+      if name in structures:
+        print('Multiple cells with name ', name, ' in GDSII file')
+        exit(1)
+      structures[name] = (start, pos + size, references)
+      name = None
+    elif record_type == UNITS:
+      factor = get_real(data, pos)
+    elif record_type == ENDLIB:
+      break
+    pos = pos + size
+  return factor, structures
+
+
+def get_subtree (structures, top_cell_name):
+  """Get names of all cells that are reachable from top cell
+
+  Args:
+      structures (dict): structure index from index_structures()
+      top_cell_name (string): name of top cell
+
+  Returns:
+      set of string: cell names, including top cell
+  """
+  subtree = set()
+  pending = [top_cell_name]
+  while len(pending) > 0:
+    name = pending.pop()
+    if name in subtree or name not in structures:
+      continue
+    subtree.add(name)
+    pending.extend(structures[name][2])
+  return subtree
+
+
+def read_structure (data, start, end, factor, layers, datatypes, library):
+  """Second pass: create gdspy cell from one structure, with polygons and paths only on wanted layers.
+  References are always created, elements are created with the same gdspy functions as in gdspy.GdsLibrary.read_gds()
+
+  Args:
+      data (mmap): GDSII file data
+      start (int): position of BGNSTR record
+      end (int): position after ENDSTR record
+      factor (float): user units per database unit
+      layers (set of int): GDSII layer numbers to read
+      datatypes (set of int): GDSII data types to read
+      library (gdspy.GdsLibrary): library that collects references for later resolution
+
+  Returns:
+      gdspy.Cell: new cell
+  """
+  cell = None
+  create_element = None
+  skip = False
+  kwargs = {}
+  pos = start
+  while pos < end:
+    size, record_type, data_type = HEADER_FORMAT.unpack_from(data, pos)
+
+    if record_type == ENDEL:
+      if (create_element is not None) and not skip:
+        cell.add(create_element(**kwargs))
+      create_element = None
+      skip = False
+      kwargs = {}
+    elif skip:
+      # element on unwanted layer, or element type that we don't need: ignore all records until ENDEL
+      pass
+    elif record_type == XY:
+      xy = factor * np.frombuffer(data, dtype='>i4', count=(size-4)//4, offset=pos+4).astype(int)
+      if 'xy' in kwargs:
+        kwargs['xy'] = np.concatenate((kwargs['xy'], xy))
+      else:
+        kwargs['xy'] = xy
+    elif record_type == LAYER:
+      layer = struct.unpack_from('>h', data, pos+4)[0]
+      skip = layer not in layers
+      kwargs['layer'] = layer
+    elif record_type in (DATATYPE, BOXTYPE):
+      datatype = struct.unpack_from('>h', data, pos+4)[0]
+      skip = datatype not in datatypes
+      kwargs['datatype'] = datatype
+    elif record_type in (BOUNDARY, BOX):
+      create_element = library._create_polygon
+    elif record_type == PATH:
+      create_element = library._create_path
+    elif record_type == SREF:
+      create_element = library._create_reference
+    elif record_type == AREF:
+      create_element = library._create_array
+    elif record_type in (TEXT, NODE):
+      # labels and nodes are not used for simulation
+      skip = True
+    elif record_type == WIDTH:
+      width = struct.unpack_from('>l', data, pos+4)[0]
+      kwargs['width'] = factor * abs(width)
+      if width < 0:
+        kwargs['width_transform'] = False
+    elif record_type == PATHTYPE:
+      kwargs['ends'] = gdspy.GdsLibrary._pathtype_dict.get(struct.unpack_from('>h', data, pos+4)[0], 'extended')
+    elif record_type == BGNEXTN:
+      kwargs['bgnextn'] = factor * struct.unpack_from('>l', data, pos+4)[0]
+    elif record_type == ENDEXTN:
+      kwargs['endextn'] = factor * struct.unpack_from('>l', data, pos+4)[0]
+    elif record_type == SNAME:
+      kwargs['ref_cell'] = get_string(data, pos, size)
+    elif record_type == COLROW:
+      kwargs['columns'], kwargs['rows'] = struct.unpack_from('>hh', data, pos+4)
+    elif record_type == STRANS:
+      kwargs['x_reflection'] = (struct.unpack_from('>H', data, pos+4)[0] & 0x8000) > 0
+    elif record_type == MAG:
+      kwargs['magnification'] = get_real(data, pos)
+    elif record_type == ANGLE:
+      kwargs['rotation'] = get_real(data, pos)
+    elif record_type == STRNAME:
+      cell = gdspy.Cell(get_string(data, pos, size), exclude_from_current=True)
+
+    pos = pos + size
+  return cell
+
+
+def read_library (filename, layers, datatypes, cell_name=None):
+  """Read GDSII file into gdspy library, with streaming access to memory-mapped file.
+  Only cells in the hierarchy below the top cell are created, and only polygons and paths on wanted layer and datatype.
+  Text labels are not read. The resulting library has exactly one top level cell.
+
+  Args:
+      filename (string): GDSII filename
+      layers (set of int): GDSII layer numbers to read
+      datatypes (set of int): GDSII data types to read
+      cell_name (string, optional): name of top cell for reading. Defaults to None (first top level cell in file).
+
+  Returns:
+      gdspy.GdsLibrary: library with cells below top cell
+  """
+  layers = set(int(layer) for layer in layers)
+  datatypes = set(int(datatype) for datatype in datatypes)
+  library = gdspy.GdsLibrary()
+  library._references = []
+
+  with open(filename, 'rb') as f:
+    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+      factor, structures = index_structures(data)
+      if len(structures) == 0:
+        print('No cells found in GDSII file ', filename)
+        exit(1)
+
+      if cell_name is not None:
+        if cell_name not in structures:
+          print('Cell ', cell_name, ' not found in GDSII file ', filename)
+          exit(1)
+        top_cell_name = cell_name
+      else:
+        # top cells are not referenced by any other cell, use first one in file order
+        referenced = set()
+        for start, end, references in structures.values():
+          referenced.update(references)
+        top_cells = [name for name in structures.keys() if name not in referenced]
+        if len(top_cells) == 0:
+          print('No top level cell found in GDSII file ', filename)
+          exit(1)
+        top_cell_name = top_cells[0]
+        if len(top_cells) > 1:
+          print('GDSII file has ', len(top_cells), ' top level cells, using ', top_cell_name)
+
+      # read cells below top cell, in file order
+      subtree = get_subtree(structures, top_cell_name)
+      for name, (start, end, references) in structures.items():
+        if name in subtree:
+          library.cells[name] = read_structure(data, start, end, factor, layers, datatypes, library)
+
+  # replace cell names in references by cell objects, same as gdspy
+  for reference in library._references:
+    if reference.ref_cell in library.cells:
+      reference.ref_cell = library.cells[reference.ref_cell]
+  return library
@@ -24,18 +24,36 @@ import os
 import sys
 import gmsh
 import math
+import time
 
 import numpy as np
 
 import json
 
-def get_tag_after_fragment (tag_to_find_list, geom_dimtags, mapping, dimension=2):
+from .util_utilities import calculate_sha256_of_file
+from .util_gds_reader import fit_polygon_arcs, rectangle_mask
+
+
+def get_fragment_map (geom_dimtags, mapping):
+    '''
+    Build lookup table for get_tag_after_fragment() once after gmsh fragmenting, 
+    so that each lookup is a dictionary access instead of a search over all original dimtags.
+      - geom_dimtags: list of all original dimtags before fragmenting
+      - mapping: list of mapping between old and new tags, obtained as return value from fragment() function
+    Returns dictionary with original (dim, tag) as key and list of new dimtags as value
+    '''
+    fragment_map = {}
+    for dimtag, new_dimtags in zip(geom_dimtags, mapping):
+        fragment_map[(dimtag[0], dimtag[1])] = new_dimtags
+    return fragment_map
+
+
+def get_tag_after_fragment (tag_to_find_list, fragment_map, dimension=2):
     '''    
     Tags usually change after gmsh fragmenting, but fragmenting returns a table with mappings.
     This function returns the new tags, if we know the original tags before fragmenting.
       - tag_to_find_list: list of tags obtained when creating the geometry
-      - geom_dimtags: list of all original dimtags before fragmenting
-      - mapping: list of mapping between old and new tags, obtained as return value from fragment() function
+      - fragment_map: dictionary from original (dim, tag) to new dimtags, obtained from get_fragment_map()
       - dimension: dimension for tags that we are looking for
     '''
 
@@ -43,13 +61,11 @@ def get_tag_after_fragment (tag_to_find_list, geom_dimtags, mapping, dimension=2
     if isinstance(tag_to_find_list, int):
         tag_to_find_list = [tag_to_find_list]
 
-    indices = [
-        i for i, x in enumerate(geom_dimtags) 
-        if x[0] == dimension and (x[1] in tag_to_find_list)
-    ]
-    raw = [mapping[i] for i in indices]
-    flat = [item for sublist in raw for item in sublist]
-    newtags = [s[-1] for s in flat]
+    # each original tag only once, in order of original tags (same order as gmsh getEntities)
+    newtags = []
+    for tag in sorted(set(tag_to_find_list)):
+        for s in fragment_map.get((dimension, tag), []):
+            newtags.append(s[-1])
 
     return newtags
 
@@ -176,131 +192,303 @@ class all_simulation_ports:
 
 
 
-def add_metals (allpolygons, metals_list, meshseed=0):
+def simplify_polygons (allpolygons, metals_list, grid=0, min_area=0, port_layers=[]):
+    """Simplify polygons before creating gmsh geometry: snap to grid, remove collinear vertices and zero-length edges,
+    remove polygons with area below min_area. Each removed vertex is one point and line less in gmsh, 
+    and one refinement target less for the mesh size fields. Polygons on port layers are not modified.
+
+    Args:
+        allpolygons (all_polygons_list): instance of all_polygons_list from reading GDSII
+        metals_list (metal_layers_list): instance of metals_list from reading stackup XML file
+        grid (float, optional): snap grid, 0 for no snapping. Defaults to 0.
+        min_area (float, optional): minimum polygon area, 0 to keep all polygons. Defaults to 0.
+        port_layers (list of int, optional): port source layer numbers, these polygons are kept as drawn. Defaults to [].
+
+    Returns:
+        int: number of vertices removed
+    """
+    # port polygons are only marked in add_ports(), so port layers are passed explicitly
+    statistics = allpolygons.store.simplify(grid, min_area, fixed_layers=port_layers)
+
+    # report per layer
+    print('Polygon simplification (grid ' + str(grid) + ', minimum area ' + str(min_area) + '):')
+    num_removed = 0
+    for layernum, (polygons_before, polygons_after, vertices_before, vertices_after) in statistics.items():
+        metal = metals_list.getbylayernumber(layernum)
+        layername = metal.name if metal is not None else 'not in stackup'
+        print(f'  Layer {layernum} ({layername}): {vertices_before} -> {vertices_after} vertices, {polygons_before} -> {polygons_after} polygons')
+        num_removed = num_removed + vertices_before - vertices_after
+    return num_removed
+
+
+def remove_duplicate_polygons (allpolygons, metals_list, contained=True, port_layers=[]):
+    """Remove polygons that are identical to another polygon on the same layer, e.g. from pcells placed twice 
+    or pins drawn on top of metal, and rectangles that are fully contained in another rectangle on the same layer. 
+    These would otherwise be extruded and fused in gmsh without changing the result. Polygons on port layers are not removed.
+
+    Args:
+        allpolygons (all_polygons_list): instance of all_polygons_list from reading GDSII
+        metals_list (metal_layers_list): instance of metals_list from reading stackup XML file
+        contained (bool, optional): also remove contained rectangles. Defaults to True.
+        port_layers (list of int, optional): port source layer numbers, these polygons are always kept. Defaults to [].
+
+    Returns:
+        int: number of polygons removed
+    """
+    # port polygons are only marked in add_ports(), so port layers are passed explicitly
+    statistics = allpolygons.store.remove_duplicates(contained, fixed_layers=port_layers)
+
+    # report per layer
+    print('Duplicate polygon removal:')
+    num_removed = 0
+    for layernum, (polygons_before, duplicates, inside) in statistics.items():
+        if duplicates + inside > 0:
+            metal = metals_list.getbylayernumber(layernum)
+            layername = metal.name if metal is not None else 'not in stackup'
+            print(f'  Layer {layernum} ({layername}): {duplicates} duplicates, {inside} contained rectangles removed, {polygons_before - duplicates - inside} polygons left')
+            num_removed = num_removed + duplicates + inside
+    if num_removed == 0:
+        print('  No duplicate polygons found')
+    return num_removed
+
+
+def prune_floating_metal (allpolygons, metals_list, simulation_ports, policy='remove', distance=0):
+    """Remove metal polygons that are not electrically connected to any port, e.g. dummy fill.
+    Connectivity is evaluated from overlapping polygons on the same layer and on layers directly above/below (vias),
+    using the above/below relations from the XML stackup. Port polygons connect to their target layer (in-plane port)
+    or from/to layers (via port). Polygons on dielectric bricks and on layers that are not in the stackup are never removed.
+    Bounding boxes are not changed, so the simulation boundary is the same as without pruning.
+
+    Args:
+        allpolygons (all_polygons_list): instance of all_polygons_list from reading GDSII
+        metals_list (metal_layers_list): instance of metals_list from reading stackup XML file
+        simulation_ports (all_simulation_ports): all simulation ports object
+        policy (str, optional): 'remove' to remove all floating polygons, 'keep' to keep them, 
+                                'distance' to keep floating polygons within distance of connected metal on the same layer. Defaults to 'remove'.
+        distance (float, optional): bounding box distance for policy 'distance'. Defaults to 0.
+
+    Returns:
+        int: number of polygons removed
+    """
+    if policy == 'keep':
+        return 0
+    if policy not in ('remove', 'distance'):
+        print('ERROR: Invalid floating metal policy ', policy, ', valid values are remove, keep or distance')
+        exit(1)
+
+    store = allpolygons.store
+    conducting = [metal for metal in metals_list.metals if not metal.is_dielectric]
+
+    # connected layer pairs: same layer and layers directly above
+    layer_pairs = []
+    for metal in conducting:
+        layer_pairs.append((int(metal.layernum), int(metal.layernum)))
+        for other in metal.above:
+            if not other.is_dielectric and other.layernum != metal.layernum:
+                layer_pairs.append((int(metal.layernum), int(other.layernum)))
+
+    # port polygons are the seeds, and connect to the metal layers of that port
+    seed_indices = []
+    for port in simulation_ports.ports:
+        port_slice = store.get_layer_slice(port.source_layernum)
+        seed_indices.extend(range(port_slice.start, port_slice.stop))
+        if port.target_layername is not None:
+            port_layernames = [port.target_layername]
+        else:
+            port_layernames = [port.from_layername, port.to_layername]
+        for layername in port_layernames:
+            port_metal = metals_list.getbylayername(layername)
+            if port_metal is not None:
+                layer_pairs.append((port.source_layernum, int(port_metal.layernum)))
+    if len(seed_indices) == 0:
+        print('WARNING: No port polygons found, floating metal is not removed')
+        return 0
+
+    connected = store.get_connected(layer_pairs, seed_indices)
+
+    # only polygons on conductor, sheet and via layers can be removed
+    layers = store.layers
+    keep = connected | ~np.isin(layers, [int(metal.layernum) for metal in conducting])
+    if policy == 'distance':
+        for layernum in np.unique(layers[~keep]):
+            layer_slice = store.get_layer_slice(layernum)
+            floating = np.flatnonzero(~keep[layer_slice]) + layer_slice.start
+            query_index, found = store.query_boxes(layernum, store.bbox[floating], distance)
+            near = np.bincount(query_index[connected[found]], minlength=len(floating)) > 0
+            keep[floating[near]] = True
+
+    # report per layer
+    counts = np.diff(store.offsets)
+    print('Floating metal removed (policy ' + policy + '):')
+    for layernum in np.unique(layers[~keep]):
+        removed = ~keep & (layers == layernum)
+        metal = metals_list.getbylayernumber(layernum)
+        print(f'  Layer {layernum} ({metal.name}): {np.sum(removed)} of {np.sum(layers == layernum)} polygons, {np.sum(counts[removed])} vertices')
+
+    num_removed = int(np.sum(~keep))
+    store.keep_polygons(keep)
+    return num_removed
+
+
+def union_metal_layers (allpolygons, metals_list):
+    """Boolean union of polygons on planar metal layers in 2D, before creating gmsh geometry. 
+    Each connected region is then extruded to one volume, and the 3D fuse of volumes in add_metals() is not required.
+    Via and sheet layers are not modified, same as in the 3D fuse.
+
+    Args:
+        allpolygons (all_polygons_list): instance of all_polygons_list from reading GDSII
+        metals_list (metal_layers_list): instance of metals_list from reading stackup XML file
+
+    Returns:
+        list of int: layer numbers that were united
+    """
+    store = allpolygons.store
+    layernums = []
+    for layernum in store.get_layers():
+        all_assigned = metals_list.getallbylayernumber (layernum)
+        if (all_assigned is not None) and all(metal.is_metal for metal in all_assigned):
+            layernums.append(layernum)
+
+    t_start = time.time()
+    statistics = store.union_layers(layernums)
+    print('2D union of planar metal layers in ' + '{:.3f}'.format(time.time() - t_start) + ' s:')
+    for layernum, (polygons_before, polygons_after) in statistics.items():
+        print(f'  Layer {layernum} ({metals_list.getbylayernumber(layernum).name}): {polygons_before} -> {polygons_after} polygons')
+    return layernums
+
+
+def add_metals (allpolygons, metals_list, meshseed=0, arc_tolerance=0, use_arcs=True, use_rectangles=False, united_layers=[]):
     """Add drawn geometries from layout layers to gmsh
 
     Args:
         allpolygons (all_polygons_list): instance of all_polygons_list from reading GDSII
         metals_list (_type_): instance of metals_list from reading stackup XML file
         meshseed (float, optional): Mesh seed to apply at polygon vertices. Defaults to 0.
+        arc_tolerance (float, optional): Tolerance for fitting polygonised circles and arcs, 0 to disable. Defaults to 0.
+        use_arcs (bool, optional): Fitted runs are created as circle arcs, False for decimated polyline. Defaults to True.
+        use_rectangles (bool, optional): Polygons that are one axis-aligned rectangle are created with addBox/addRectangle. Defaults to False.
+        united_layers (list of int, optional): Layer numbers where polygons were already united in 2D, no 3D fuse required. Defaults to [].
 
     Returns:
         list of created tags
     """
 
-    def get_layer_volumes (metals_list, layername):
-        # return all volume tags for a given  layer name
-        this_metal = metals_list.getbylayername(layername)
-        
-        # get volumes on this layer
-        delta = 0.001
-        layer_zmin = this_metal.zmin - delta/2
-        layer_zmax = this_metal.zmax + delta/2
-            
-        # This returns the list of volumes inside
-        # But unfortunately, it will trigger also for thinner layers enclosed inside that volume
-        volumes_in_bounding_box = gmsh.model.getEntitiesInBoundingBox(-math.inf,-math.inf,layer_zmin,math.inf,math.inf,layer_zmax,3)
-        # not iterate over return values and check exact height
-        volume_on_layer_list = []
-        for volume in volumes_in_bounding_box:
-            volume_tag = volume[1]
-            xmin, ymin, zmin, xmax, ymax, zmax = gmsh.model.getBoundingBox(3, volume_tag)
-            if (abs(zmin-layer_zmin) < delta) and (abs(zmax-layer_zmax) < delta):
-                volume_on_layer_list.append(volume)
-            
-        return  volume_on_layer_list
-
-
-    def get_sheet_surfaces (metals_list, layername):
-        # return all surface tags for a given  layer name
-        # NOTE: This is specialized for thin sheet and only evaluates at zmin, ignoring zmax value
-        this_metal = metals_list.getbylayername(layername)
-        
-        # get volumes on this layer
-        delta = 0.001
-        sheet_zmin = this_metal.zmin - delta/2
-        sheet_zmax = this_metal.zmin + delta/2  # evaluate zmin, ignore zmax, because we look at thin sheet layers
-            
-        # This returns the list of volumes inside
-        # But unfortunately, it will trigger also for thinner layers enclosed inside that volume
-        surfaces_in_bounding_box = gmsh.model.getEntitiesInBoundingBox(-math.inf,-math.inf,sheet_zmin,math.inf,math.inf,sheet_zmax,2)
-        # not iterate over return values and check exact height
-        surfaces_on_layer_list = []
-        for surface in surfaces_in_bounding_box:
-            surfaces_on_layer_list.append(surface)
-            
-        return  surfaces_on_layer_list
-
-
-
     kernel = gmsh.model.occ
 
     # add geometries on metal and via layers
-    for poly in allpolygons.polygons:
-        # each poly knows its layer number
+    # iterate layer by layer over the polygon store, polygon points are array views into the store
+    store = allpolygons.store
+    arc_center_tags = []
+    # registry of created entities, key is layer name, value is list of (dim, tag)
+    # volumes for metals, vias and dielectric bricks, surfaces for sheet layers
+    layer_dimtags = {}
+    # optional: polygons that are a single rectangle are created with addBox/addRectangle, without points and lines for each vertex
+    # other rectilinear polygons are not split into rectangles, because the additional fuse is slower than the cheaper construction
+    if use_rectangles:
+        is_rectangle = rectangle_mask(store.coords, np.diff(store.offsets))
+    else:
+        is_rectangle = np.zeros(len(store.layers), dtype=bool)
+    for layernum in store.get_layers():
 
         # We might have one layout polygon mapped to multiple layers in stackup, for special use cases in MIM etc
         # We then  have multiple entries in the XML that share the same layer number
         # For that special case, get ALL metals from technology file for that same polygon
-        all_assigned = metals_list.getallbylayernumber (poly.layernum) 
+        all_assigned = metals_list.getallbylayernumber (layernum) 
         if all_assigned is not None:
-            for metal in all_assigned:
-
-                # add Polygon to gmsh using poly.pts
-                linetaglist = []
-                vertextaglist = []
-                numvertices = len(poly.pts_x)
-
-                for v in range(numvertices):
-                    # addPoint parameters: x (double), y (double), z (double), meshSize = 0. (double), tag = -1 (integer)
-                    vertextag = kernel.addPoint(poly.pts_x[v], poly.pts_y[v], metal.zmin, meshseed, -1)
-                    vertextaglist.append(vertextag)
-
-                # after writing the vertices, we combine them to boundary lines
-                for v in range(numvertices):
-                    pt_start = vertextaglist[v]
-                    if v==(numvertices-1):
-                        pt_end = vertextaglist[0]
+            layer_slice = store.get_layer_slice(layernum)
+            for index in range(layer_slice.start, layer_slice.stop):
+                # boundary loops of this polygon: outer loop first, then holes (if polygon has cutouts)
+                loops = store.get_loops(index)
+
+                # optional: replace short segments on polygonised circles by arcs or coarser polyline
+                # centers has one entry per edge, NaN for straight line
+                if arc_tolerance > 0:
+                    fitted = [fit_polygon_arcs(pts, arc_tolerance, use_arcs) for pts in loops]
+                else:
+                    fitted = [(pts, None) for pts in loops]
+
+                for metal in all_assigned:
+                    created = layer_dimtags.setdefault(metal.name, [])
+
+                    if is_rectangle[index]:
+                        # bbox columns xmin, xmax, ymin, ymax
+                        xmin, xmax, ymin, ymax = store.bbox[index]
+                        if metal.is_sheet:
+                            created.append((2, kernel.addRectangle(xmin, ymin, metal.zmin, xmax-xmin, ymax-ymin)))
+                        elif metal.thickness <= 0:
+                            kernel.addRectangle(xmin, ymin, metal.zmin, xmax-xmin, ymax-ymin)
+                        else:
+                            created.append((3, kernel.addBox(xmin, ymin, metal.zmin, xmax-xmin, ymax-ymin, metal.thickness)))
+                        continue
+
+                    # add Polygon to gmsh, one curve loop for each boundary loop
+                    curvetaglist = []
+                    for pts, centers in fitted:
+                        linetaglist = []
+                        vertextaglist = []
+                        numvertices = len(pts)
+
+                        for v in range(numvertices):
+                            # addPoint parameters: x (double), y (double), z (double), meshSize = 0. (double), tag = -1 (integer)
+                            vertextag = kernel.addPoint(pts[v,0], pts[v,1], metal.zmin, meshseed, -1)
+                            vertextaglist.append(vertextag)
+
+                        # after writing the vertices, we combine them to boundary lines
+                        for v in range(numvertices):
+                            pt_start = vertextaglist[v]
+                            if v==(numvertices-1):
+                                pt_end = vertextaglist[0]
+                            else:
+                                pt_end = vertextaglist[v+1]
+
+                            if (centers is not None) and not np.isnan(centers[v,0]):
+                                # addCircleArc parameters: startTag (integer), centerTag (integer), endTag (integer), tag = -1 (integer)
+                                centertag = kernel.addPoint(centers[v,0], centers[v,1], metal.zmin, meshseed, -1)
+                                arc_center_tags.append((0,centertag))
+                                linetag = kernel.addCircleArc(pt_start, centertag, pt_end, -1)
+                            else:
+                                # addLine parameters: startTag (integer), endTag (integer), tag = -1 (integer)
+                                linetag = kernel.addLine(pt_start, pt_end, -1)
+                            linetaglist.append(linetag)
+
+                        # after creating the lines, we can create a curve loop
+                        # to do so, we need the line segment numbers again
+                        curvetag = kernel.addCurveLoop(linetaglist, tag=-1)
+                        curvetaglist.append(curvetag)
+
+                    # one surface from outer curve loop, additional curve loops are holes
+                    surfacetag = kernel.addPlaneSurface(curvetaglist, tag=-1)
+
+                    if not (metal.is_sheet):
+                        if metal.thickness > 0:
+                            extruded = kernel.extrude([(2,surfacetag)],0,0,metal.thickness)
+                            created.extend([dimtag for dimtag in extruded if dimtag[0] == 3])
                     else:
-                        pt_end = vertextaglist[v+1]
-
-                    # addLine parameters: startTag (integer), endTag (integer), tag = -1 (integer)
-                    linetag = kernel.addLine(pt_start, pt_end, -1)
-                    linetaglist.append(linetag)
+                        created.append((2,surfacetag))
 
-                # after creating the lines, we can create a curve loop and a surface 
-                # to do so, we need the line segment numbers again
-                curvetag   = kernel.addCurveLoop(linetaglist, tag=-1)
-                surfacetag = kernel.addPlaneSurface([curvetag], tag=-1)
+    # arc center points are only used for construction, they are not part of the geometry
+    if len(arc_center_tags) > 0:
+        kernel.remove(arc_center_tags)
+    kernel.synchronize()
 
-                if not (metal.is_sheet):
-                    if metal.thickness > 0:
-                        kernel.extrude([(2,surfacetag)],0,0,metal.thickness)
 
-    kernel.synchronize()
+    # We have created initial 3D volumes from GDSII, now merge volumes on each planar metal layer
+    # the registry is updated with the fuse result, so that we never need to query gmsh for entities on a layer
+    for metal in metals_list.metals:
+        if not (metal.is_via or metal.is_sheet):            
+            # planar metal that was united in 2D already has one volume per connected region
+            if int(metal.layernum) in united_layers:
+                continue
 
+            # try to merge planar metal volumes
+            layername = metal.name
+            volume_on_layer_list = layer_dimtags.get(layername, [])
 
-    # We have created initial 3D volumes from GDSII, now iterate over 3D entities to merge them
-    volumelist = gmsh.model.getEntities(3)
-    volumecount = len(volumelist)
-    if volumecount>0:
-        # try to merge volumes on each layer
-        for metal in metals_list.metals:
-            if not (metal.is_via or metal.is_sheet):            
-                # try to merge planar metal volumes
-                layername = metal.name
-                volume_on_layer_list = get_layer_volumes(metals_list, layername)
-
-                # try boolean union of volumes on this layer
-                if len(volume_on_layer_list)>1:
-                    # get first element and delete from list
-                    first = volume_on_layer_list.pop(0)
-                    # print('  Layer = ' + layername)
-                    # print('  FUSE, object = ' + str(first)) 
-                    # print('  FUSE, tool   = ' + str(volume_on_layer_list)) 
-                    
-                    gmsh.model.occ.fuse([first],volume_on_layer_list, -1)
-                    gmsh.model.occ.synchronize()
+            # try boolean union of volumes on this layer
+            if len(volume_on_layer_list)>1:
+                # first element is object, other elements are tools
+                layer_dimtags[layername], _ = kernel.fuse(volume_on_layer_list[:1], volume_on_layer_list[1:], -1)
+    kernel.synchronize()
 
 
     tags_created_3D = {} # each layer has a flat list
@@ -309,71 +497,45 @@ def add_metals (allpolygons, metals_list, meshseed=0):
 
     # Remove volume of planar metals, keep surface only
     # Store tags of created geometries, one list per layer, key is layer name
+    # layers without polygons are skipped
+    for metal in metals_list.metals:
+        layername = metal.name
+
+        # all metals and vias are volumes at this processing step, sorted by tag (creation order)
+        # the only exception are sheet layers, handled below
+        dimtags_on_layer = sorted(layer_dimtags.pop(layername, []))
+        if len(dimtags_on_layer) == 0:
+            continue
+
+        # check if we have planar metal or via, process differently
+        if metal.is_via or metal.is_dielectric:
+            # vias and dielectric bricks are kept as 3D volumes
+            layer_tags_3D = tags_created_3D.setdefault(layername, [])
+            for dimtag in dimtags_on_layer:
+                volumetag = dimtag[1]
+                layer_tags_3D.append(volumetag)
+
+        elif metal.is_metal:
+            # planar metal is shelved, we keep the surfaces and remove the volume  
+            layer_perpolytags_2D = taglist_created_2D.setdefault(layername, [])
+            for dimtag in dimtags_on_layer:
+                volumetag = dimtag[1]
+               
+                # get all surfaces of 3d body
+                _, surfaceloops = kernel.getSurfaceLoops(volumetag)
+                layer_perpolytags_2D.append(surfaceloops)
+
+                # remove volume, for simulation we only keep surfaces
+                kernel.remove([(3,volumetag)])
+
+        elif metal.is_sheet:
+            tags_created_sheet2D.setdefault(layername, []).extend(dimtags_on_layer)
 
-    volumelist = gmsh.model.getEntities(3)
-    volumecount = len(volumelist)
-    if volumecount>0:
-        # print('Number of volumes after merging = ' + str(volumecount)) 
-
-        for metal in metals_list.metals:
-            layername = metal.name
-
-            # prepare the lists that hold the tags
-            if layername in taglist_created_2D.keys():
-                layer_perpolytags_2D = taglist_created_2D[layername]
-            else:
-                layer_perpolytags_2D = []
-                taglist_created_2D[layername] = layer_perpolytags_2D
-
-
-            if layername in tags_created_3D.keys():
-                layer_tags_3D = tags_created_3D[layername]                   
-            else:
-                layer_tags_3D = []
-                tags_created_3D[layername] = layer_tags_3D 
-
-
-            if layername in tags_created_sheet2D.keys():
-                layer_tags_sheets = tags_created_sheet2D[layername]                   
-            else:
-                layer_tags_sheets = []
-                tags_created_sheet2D[layername] = layer_tags_sheets 
-
-
-
-            # get layer volumes, all metals and vias are volumes at this processing step
-            # the only exception are sheet layers, handled below
-            volume_on_layer_list = get_layer_volumes(metals_list, layername)
-
-            # check if we have planar metal or via, process differently
-            if metal.is_via or metal.is_dielectric:
-                # vias and dielectric bricks are kept as 3D volumes
-                for dimtag in volume_on_layer_list:
-                    volumetag = dimtag[1]
-                    tags_created_3D[layername].append(volumetag)
-
-            elif metal.is_metal:
-                # planar metal is shelved, we keep the surfaces and remove the volume  
-                for dimtag in volume_on_layer_list:
-                    volumetag = dimtag[1]
-                   
-                    # get all surfaces of 3d body
-                    _, surfaceloops = kernel.getSurfaceLoops(volumetag)
-                    layer_perpolytags_2D.append(surfaceloops)
-
-                    # remove volume, for simulation we only keep surfaces
-                    kernel.remove([(3,volumetag)])
-
-            elif metal.is_sheet:
-                surfaces_on_layer_list = get_sheet_surfaces (metals_list, layername)
-                tags_created_sheet2D[layername] = surfaces_on_layer_list 
-
-            else:
-                print('Unknown "Type" assigned to layer ', metal.name)
-                exit(1)
-
+        else:
+            print('Unknown "Type" assigned to layer ', metal.name)
+            exit(1)
 
-        kernel.synchronize()
+    kernel.synchronize()
     return tags_created_3D, taglist_created_2D, tags_created_sheet2D            
 
 
@@ -557,125 +719,129 @@ def add_ports (kernel, allpolygons, metals_list, simulation_ports, meshseed = 0)
     # data structure that we write to Palace output directory with information about port Z0 and port dimensions
     all_port_information = []
 
-    # add geometries on metal and via layers
-    for poly in allpolygons.polygons:
-        # each poly knows its layer number
-        # get material name for poly, by using metal information from stackup
-        metal = metals_list.getbylayernumber (poly.layernum)
-        if metal is None: # this layer does not exist in XML stackup
-            # found a layer that is not defined in stackup from XML, check if used for ports
-            if poly.layernum in simulation_ports.portlayers:
-                # mark polygon for special handling in meshing
-                poly.is_port = True 
-
-                port_dimtag = []
-                # find port definition for this GDSII source layer number
-                port = simulation_ports.get_port_by_layernumber(poly.layernum)
-                if port is not None:
-
-                    port_information_data = {}
-                    port_information_data['portnumber'] = port.portnumber
-                    port_information_data['Z0'] = port.port_Z0
-                    port_information_data['direction'] = port.direction.upper()
-
-                    portnum = port.portnumber
-                    xmin = poly.xmin
-                    xmax = poly.xmax
-                    ymin = poly.ymin
-                    ymax = poly.ymax
-                    
-                    # port z coordinates are different between in-plane ports and via ports
-                    if port.target_layername is not None:
-                        # in-plane port   
-                        port_metal = metals_list.getbylayername(port.target_layername)
-                        zmin = port_metal.zmin
-                        zmax = port_metal.zmin # port has zero thickness
-
-                        # rectangle in xy plane
+    # add geometries on port layers, only port layers need to be evaluated from the polygon store
+    store = allpolygons.store
+    for layernum in store.get_layers():
+        # get material name for layer, by using metal information from stackup
+        metal = metals_list.getbylayernumber (layernum)
+        if metal is not None: # this layer exists in XML stackup, no port layer
+            continue
+        # found a layer that is not defined in stackup from XML, check if used for ports
+        if layernum not in simulation_ports.portlayers:
+            continue
+        layer_slice = store.get_layer_slice(layernum)
+        for poly in allpolygons.polygons[layer_slice]:
+            # mark polygon for special handling in meshing
+            poly.is_port = True 
+
+            port_dimtag = []
+            # find port definition for this GDSII source layer number
+            port = simulation_ports.get_port_by_layernumber(poly.layernum)
+            if port is not None:
+
+                port_information_data = {}
+                port_information_data['portnumber'] = port.portnumber
+                port_information_data['Z0'] = port.port_Z0
+                port_information_data['direction'] = port.direction.upper()
+
+                portnum = port.portnumber
+                xmin = poly.xmin
+                xmax = poly.xmax
+                ymin = poly.ymin
+                ymax = poly.ymax
+                
+                # port z coordinates are different between in-plane ports and via ports
+                if port.target_layername is not None:
+                    # in-plane port   
+                    port_metal = metals_list.getbylayername(port.target_layername)
+                    zmin = port_metal.zmin
+                    zmax = port_metal.zmin # port has zero thickness
+
+                    # rectangle in xy plane
+                    pt1 = kernel.addPoint(xmin, ymin, zmin, meshseed, -1)
+                    pt2 = kernel.addPoint(xmin, ymax, zmin, meshseed, -1)
+                    pt3 = kernel.addPoint(xmax, ymax, zmin, meshseed, -1)
+                    pt4 = kernel.addPoint(xmax, ymin, zmin, meshseed, -1)
+
+                    # port information that we write to Palace output directory
+                    if 'X' in port.direction:
+                        length = xmax-xmin
+                        width  = ymax-ymin
+                    else:    
+                        length = ymax-ymin
+                        width  = xmax-xmin
+                    port_information_data['length'] = length                           
+                    port_information_data['width']  = width      
+
+                else:
+                   # via port 
+                   from_metal = metals_list.getbylayername(port.from_layername)
+                   to_metal   = metals_list.getbylayername(port.to_layername)
+
+                   if to_metal is None:
+                      print('[ERROR] Invalid layer ' , port.to_layername, ' in port definition, not found in XML stackup file!')
+                      sys.exit(1)                             
+                   if from_metal is None:
+                      print('[ERROR] Invalid layer ' , port.from_layername, ' in port definition, not found in XML stackup file!')
+                      sys.exit(1)                             
+
+                   if from_metal.zmin < to_metal.zmin:
+                       lower = from_metal
+                       upper = to_metal
+                   else:  
+                       lower = to_metal
+                       upper = from_metal
+
+                   zmin = lower.zmax
+                   zmax = upper.zmin
+                   length = zmax-zmin
+
+                   # port is expected to be a line only (no area), we now create surface in z direction
+                   # to make sure that we have a line only, we check size in x and y direction
+                   size_x = xmax - xmin
+                   size_y = ymax - ymin 
+                   
+                   if size_y > size_x:
+                        # ports are line in y direction
                         pt1 = kernel.addPoint(xmin, ymin, zmin, meshseed, -1)
                         pt2 = kernel.addPoint(xmin, ymax, zmin, meshseed, -1)
-                        pt3 = kernel.addPoint(xmax, ymax, zmin, meshseed, -1)
+                        pt3 = kernel.addPoint(xmin, ymax, zmax, meshseed, -1)
+                        pt4 = kernel.addPoint(xmin, ymin, zmax, meshseed, -1)
+                        width = size_y
+                   else: 
+                        # ports are line in x direction
+                        pt1 = kernel.addPoint(xmin, ymin, zmin, meshseed, -1)
+                        pt2 = kernel.addPoint(xmin, ymin, zmax, meshseed, -1)
+                        pt3 = kernel.addPoint(xmax, ymin, zmax, meshseed, -1)
                         pt4 = kernel.addPoint(xmax, ymin, zmin, meshseed, -1)
+                        width = size_x
 
-                        # port information that we write to Palace output directory
-                        if 'X' in port.direction:
-                            length = xmax-xmin
-                            width  = ymax-ymin
-                        else:    
-                            length = ymax-ymin
-                            width  = xmax-xmin
-                        port_information_data['length'] = length                           
-                        port_information_data['width']  = width      
+                   port_information_data['length'] = length                            
+                   port_information_data['width']  = width      
 
-                    else:
-                       # via port 
-                       from_metal = metals_list.getbylayername(port.from_layername)
-                       to_metal   = metals_list.getbylayername(port.to_layername)
-
-                       if to_metal is None:
-                          print('[ERROR] Invalid layer ' , port.to_layername, ' in port definition, not found in XML stackup file!')
-                          sys.exit(1)                             
-                       if from_metal is None:
-                          print('[ERROR] Invalid layer ' , port.from_layername, ' in port definition, not found in XML stackup file!')
-                          sys.exit(1)                             
-
-                       if from_metal.zmin < to_metal.zmin:
-                           lower = from_metal
-                           upper = to_metal
-                       else:  
-                           lower = to_metal
-                           upper = from_metal
-
-                       zmin = lower.zmax
-                       zmax = upper.zmin
-                       length = zmax-zmin
-
-                       # port is expected to be a line only (no area), we now create surface in z direction
-                       # to make sure that we have a line only, we check size in x and y direction
-                       size_x = xmax - xmin
-                       size_y = ymax - ymin 
-                       
-                       if size_y > size_x:
-                            # ports are line in y direction
-                            pt1 = kernel.addPoint(xmin, ymin, zmin, meshseed, -1)
-                            pt2 = kernel.addPoint(xmin, ymax, zmin, meshseed, -1)
-                            pt3 = kernel.addPoint(xmin, ymax, zmax, meshseed, -1)
-                            pt4 = kernel.addPoint(xmin, ymin, zmax, meshseed, -1)
-                            width = size_y
-                       else: 
-                            # ports are line in x direction
-                            pt1 = kernel.addPoint(xmin, ymin, zmin, meshseed, -1)
-                            pt2 = kernel.addPoint(xmin, ymin, zmax, meshseed, -1)
-                            pt3 = kernel.addPoint(xmax, ymin, zmax, meshseed, -1)
-                            pt4 = kernel.addPoint(xmax, ymin, zmin, meshseed, -1)
-                            width = size_x
-
-                       port_information_data['length'] = length                            
-                       port_information_data['width']  = width      
-
-                    port_information_data['xmin'] = xmin                           
-                    port_information_data['xmax'] = xmax      
-                    port_information_data['ymin'] = ymin                           
-                    port_information_data['ymax'] = ymax      
-                    port_information_data['zmin'] = zmin                           
-                    port_information_data['zmax'] = zmax      
-
-                    all_port_information.append(port_information_data)
-
-                    # for both in-plane and vertical
-                    line1 = kernel.addLine(pt1,pt2,-1) 
-                    line2 = kernel.addLine(pt2,pt3,-1) 
-                    line3 = kernel.addLine(pt3,pt4,-1) 
-                    line4 = kernel.addLine(pt4,pt1,-1) 
-                    linetaglist = [line1, line2, line3, line4]
-
-                    # after creating the lines, we can create a curve loop and a surface 
-                    # to do so, we need the line segment numbers again
-                    curvetag   = kernel.addCurveLoop(linetaglist, tag=-1)
-                    surfacetag = kernel.addPlaneSurface([curvetag], tag=-1)
-
-                    port_dimtag.append(surfacetag)
-                    tags_created_2D['P'+str(portnum)]=port_dimtag
+                port_information_data['xmin'] = xmin                           
+                port_information_data['xmax'] = xmax      
+                port_information_data['ymin'] = ymin                           
+                port_information_data['ymax'] = ymax      
+                port_information_data['zmin'] = zmin                           
+                port_information_data['zmax'] = zmax      
+
+                all_port_information.append(port_information_data)
+
+                # for both in-plane and vertical
+                line1 = kernel.addLine(pt1,pt2,-1) 
+                line2 = kernel.addLine(pt2,pt3,-1) 
+                line3 = kernel.addLine(pt3,pt4,-1) 
+                line4 = kernel.addLine(pt4,pt1,-1) 
+                linetaglist = [line1, line2, line3, line4]
+
+                # after creating the lines, we can create a curve loop and a surface 
+                # to do so, we need the line segment numbers again
+                curvetag   = kernel.addCurveLoop(linetaglist, tag=-1)
+                surfacetag = kernel.addPlaneSurface([curvetag], tag=-1)
+
+                port_dimtag.append(surfacetag)
+                tags_created_2D['P'+str(portnum)]=port_dimtag
 
     kernel.synchronize()
 
@@ -821,6 +987,28 @@ def create_palace (excite_ports, settings):
     # separate_z_group_for_metals setting 
     z_thickness_factor = get_optional_setting (settings, "z_thickness_factor", 1)
 
+    # polygon simplification before creating gmsh geometry, off by default
+    simplify = get_optional_setting (settings, "simplify_polygons", False)
+    simplify_grid = get_optional_setting (settings, "simplify_grid", 0.001)
+    simplify_min_area = get_optional_setting (settings, "simplify_min_area", 0)
+
+    # unite planar metal polygons in 2D instead of 3D fuse in gmsh, off by default
+    union_2D = get_optional_setting (settings, "union_2D", False)
+
+    # create single rectangle polygons with addBox/addRectangle, off by default
+    use_rectangles = get_optional_setting (settings, "use_rectangles", False)
+
+    # remove duplicate polygons and contained rectangles, off by default
+    remove_duplicates = get_optional_setting (settings, "remove_duplicates", False)
+
+    # fit polygonised circles and arcs within tolerance, as circle arcs or decimated polyline, off by default
+    arc_tolerance = get_optional_setting (settings, "arc_tolerance", 0)
+    use_arcs = get_optional_setting (settings, "arc_fit_arcs", True)
+
+    # metal that is not connected to any port: 'keep' (default), 'remove' or 'distance'
+    floating_metal = get_optional_setting (settings, "floating_metal", 'keep')
+    floating_metal_distance = get_optional_setting (settings, "floating_metal_distance", 0)
+
     # boundary conditions default to absorbing
     boundary_condition = get_optional_setting (settings,'boundary',['ABC','ABC','ABC','ABC','ABC','ABC'])
     print ('Using boundary condition ', str(boundary_condition))
@@ -982,10 +1170,29 @@ def create_palace (excite_ports, settings):
     gmsh.model.add("from_gds")
 
        
+    # optional simplification of polygons: grid snap, collinear vertices, zero-length edges, tiny polygons
+    if simplify:
+        simplify_polygons (allpolygons, metals_list, simplify_grid, simplify_min_area, simulation_ports.portlayers)
+
+    # optional removal of duplicate polygons and contained rectangles
+    if remove_duplicates:
+        remove_duplicate_polygons (allpolygons, metals_list, port_layers=simulation_ports.portlayers)
+
+    # optional removal of metal that is not connected to any port, e.g. dummy fill
+    if floating_metal != 'keep':
+        prune_floating_metal (allpolygons, metals_list, simulation_ports, floating_metal, floating_metal_distance)
+
+    # optional 2D union of planar metal layers, then the 3D fuse in add_metals is not required
+    united_layers = []
+    if union_2D:
+        united_layers = union_metal_layers (allpolygons, metals_list)
+
     # add drawn geometries to gmsh model
     # store metal tags for surfaces and volumes per layer 
     print('Adding metal tags ...')
-    metal_tags_created_3D, metal_perpolytags_2D, sheet_tags_created_2D = add_metals (allpolygons, metals_list)
+    t_start = time.time()
+    metal_tags_created_3D, metal_perpolytags_2D, sheet_tags_created_2D = add_metals (allpolygons, metals_list, 0, arc_tolerance, use_arcs, use_rectangles, united_layers)
+    print('Metal geometry created in ' + '{:.3f}'.format(time.time() - t_start) + ' s')
 
     # add ports
     print('Adding ports ...')
@@ -1006,6 +1213,8 @@ def create_palace (excite_ports, settings):
     # Now embed/fragment them, return value geom_map keeps mapping between original tags and new tags after fragmenting
     _, geom_map = kernel.fragment(geom_dimtags, [])   
     kernel.synchronize()
+    # lookup table from original dimtag to new dimtags, used for all tag lookups below
+    fragment_map = get_fragment_map(geom_dimtags, geom_map)
 
 
     # ---------------- VOLUMES -----------------
@@ -1018,7 +1227,7 @@ def create_palace (excite_ports, settings):
     for layername in metal_tags_created_3D.keys():   # drawn volumes, for GDS metals that is vias and dielectric bricks only
         # gmsh
         volumes_of_layer = metal_tags_created_3D[layername]
-        new_tags = get_tag_after_fragment (volumes_of_layer, geom_dimtags, geom_map, dimension=3)
+        new_tags = get_tag_after_fragment (volumes_of_layer, fragment_map, dimension=3)
         phys_group = gmsh.model.addPhysicalGroup(3, new_tags, tag=-1)
         gmsh.model.setPhysicalName(3, phys_group, layername)
 
@@ -1045,7 +1254,7 @@ def create_palace (excite_ports, settings):
     for dielectricname in dielectric_tags_created_3D.keys():
         print('Dielectric = ', dielectricname)
         volumes_of_layer = dielectric_tags_created_3D[dielectricname]
-        new_tags = get_tag_after_fragment (volumes_of_layer, geom_dimtags, geom_map, dimension=3)
+        new_tags = get_tag_after_fragment (volumes_of_layer, fragment_map, dimension=3)
         max_index = len(volumes_of_layer)
         phys_group = gmsh.model.addPhysicalGroup(3, new_tags[0:max_index], tag=-1)  
         gmsh.model.setPhysicalName(3, phys_group, dielectricname)
@@ -1115,7 +1324,7 @@ def create_palace (excite_ports, settings):
                 if len(polysurface)>0:
                     i = i+1
 
-                    new_tags = get_tag_after_fragment (polysurface[0], geom_dimtags, geom_map, dimension=2)
+                    new_tags = get_tag_after_fragment (polysurface[0], fragment_map, dimension=2)
 
                     # new_tags includes ALL surfaces of this one polygon
                     # we now loop over all surfaces to check normal (get surface orientation)
@@ -1178,7 +1387,7 @@ def create_palace (excite_ports, settings):
             # Meshing: get all boundary lines of metals, store the tags for local refinement
             for polysurface in metal_perpolytags_2D[layername]:
                 if len(polysurface)>0:
-                    new_tags = get_tag_after_fragment (polysurface[0], geom_dimtags, geom_map, dimension=2)
+                    new_tags = get_tag_after_fragment (polysurface[0], fragment_map, dimension=2)
 
                     for tag in new_tags:
                         clt, ct = kernel.getCurveLoops(tag)
@@ -1196,7 +1405,7 @@ def create_palace (excite_ports, settings):
 
         # gmsh
         port_surface = port_tags_created_2D[porttag]
-        new_tag = get_tag_after_fragment (port_surface, geom_dimtags, geom_map, dimension=2)
+        new_tag = get_tag_after_fragment (port_surface, fragment_map, dimension=2)
         phys_group = gmsh.model.addPhysicalGroup(2, new_tag, tag=-1)
         gmsh.model.setPhysicalName(2, phys_group, porttag)
         port_surface_tags.extend(new_tag)
@@ -1238,7 +1447,7 @@ def create_palace (excite_ports, settings):
             for surface in sheettag_list:
                 i = i +1
                 surfacetag = surface[1]
-                new_tags = get_tag_after_fragment (surfacetag, geom_dimtags, geom_map, dimension=2)
+                new_tags = get_tag_after_fragment (surfacetag, fragment_map, dimension=2)
 
                 # add sheet tags for boundary meshing also
                 for tag in new_tags:
@@ -1272,7 +1481,7 @@ def create_palace (excite_ports, settings):
 
     # get surface tags of airbox 
     airbox_volume_tag = dielectric_tags_created_3D['airbox'] 
-    airbox_volume_tag = get_tag_after_fragment (airbox_volume_tag, geom_dimtags, geom_map, dimension=3)
+    airbox_volume_tag = get_tag_after_fragment (airbox_volume_tag, fragment_map, dimension=3)
     airbox_volume_tag = airbox_volume_tag[0]
 
     _, simulation_boundary = kernel.getSurfaceLoops(airbox_volume_tag)
@@ -1542,16 +1751,7 @@ def create_palace (excite_ports, settings):
 
 
 # Utility functions for hash file.
-# Not used by gds2palace yet
-
-def calculate_sha256_of_file(filename):
-    import hashlib
-    sha256_hash = hashlib.sha256()
-    with open(filename, 'rb') as f:
-        for byte_block in iter(lambda: f.read(4096), b""):
-            sha256_hash.update(byte_block)
-
-    return sha256_hash.hexdigest()
+# calculate_sha256_of_file() is imported from util_utilities, it is also used by the GDSII reader cache
 
 def write_hash_to_data_folder (excitation_path, hash_value):
     filename = os.path.join(excitation_path, 'simulation_model.hash')
@@ -24,10 +24,14 @@
 # Added support for sheet resistance 07 Oct 2025 Volker Muehlhaus 
 # Added docstrings 
 # 20 Nov 2025: added functionality to get relative positions between metals
+# 17 Oct 2026: indexes for lookup by name, layer number and z position, compiled stackup cache
 
-__version__ = "1.1.0"
+__version__ = "1.2.0"
 
 import os
+import bisect
+import hashlib
+import pickle
 import xml.etree.ElementTree 
 
 
@@ -84,6 +88,7 @@ class stackup_materials_list:
     """
     self.materials = []      # list with material objects
     self.eps_max   = 0
+    self._by_name  = {}      # index: material name -> material, last one wins if name is used twice
     
   def append (self, material):
     """Append one material
@@ -93,6 +98,7 @@ class stackup_materials_list:
 
     # append material
     self.materials.append (material)
+    self._by_name[material.name] = material
     # set maximum permittivity in model
     self.eps_max = max(self.eps_max, material.eps)
   
@@ -106,11 +112,96 @@ class stackup_materials_list:
     """
   
     # find material object from materialname
-    found = None
-    for material in self.materials:
-      if material.name == materialname:
-        found = material
-    return found    
+    return self._by_name.get(materialname)
+
+
+# -------------------- z position index ---------------------------
+
+class z_interval_index:
+  """
+    index of stackup objects (metals or dielectrics) sorted by zmin and by zmax, for queries by z position with binary search.
+    Query results are returned in the order of the original list.
+  """
+
+  def __init__ (self, items):
+    """Build index from current z positions, must be rebuilt when z positions change
+
+    Args:
+        items (list): objects with .zmin and .zmax
+    """
+    self.items = list(items)
+    self.zmin_order = sorted(range(len(self.items)), key=lambda n: self.items[n].zmin)
+    self.zmin_values = [self.items[n].zmin for n in self.zmin_order]
+    self.zmax_order = sorted(range(len(self.items)), key=lambda n: self.items[n].zmax)
+    self.zmax_values = [self.items[n].zmax for n in self.zmax_order]
+
+
+  def _find (self, values, order, low, high):
+    # positions in original list where low <= value <= high
+    start = bisect.bisect_left(values, low)
+    stop = bisect.bisect_right(values, high)
+    return sorted(order[start:stop])
+
+
+  def get_positions_by_zmin (self, z, delta=1e-5):
+    """Positions in original list of all items with zmin equal to z within delta
+    Args:
+        z (float): z position
+        delta (float, optional): what is considered equal. Defaults to 1e-5.
+    Returns:
+        list of int: positions in original list
+    """
+    candidates = self._find(self.zmin_values, self.zmin_order, z - delta, z + delta)
+    return [n for n in candidates if abs(self.items[n].zmin - z) < delta]
+
+
+  def get_positions_by_zmax (self, z, delta=1e-5):
+    """Positions in original list of all items with zmax equal to z within delta
+    Args:
+        z (float): z position
+        delta (float, optional): what is considered equal. Defaults to 1e-5.
+    Returns:
+        list of int: positions in original list
+    """
+    candidates = self._find(self.zmax_values, self.zmax_order, z - delta, z + delta)
+    return [n for n in candidates if abs(self.items[n].zmax - z) < delta]
+
+
+  def get_by_zrange (self, zmin, zmax, delta=1e-5):
+    """All items with zmin and zmax equal to the given values within delta
+    Args:
+        zmin (float): lower z position
+        zmax (float): upper z position
+        delta (float, optional): what is considered equal. Defaults to 1e-5.
+    Returns:
+        list: items with that z range
+    """
+    return [self.items[n] for n in self.get_positions_by_zmin(zmin, delta) if abs(self.items[n].zmax - zmax) < delta]
+
+
+  def get_inside (self, zmin, zmax):
+    """All items inside the z range, including zmin and excluding zmax exactly
+    Args:
+        zmin (float): lower z position
+        zmax (float): upper z position
+    Returns:
+        list: items with item.zmin >= zmin and item.zmax < zmax
+    """
+    start = bisect.bisect_left(self.zmin_values, zmin)
+    stop = bisect.bisect_left(self.zmin_values, zmax)
+    return [self.items[n] for n in sorted(self.zmin_order[start:stop]) if self.items[n].zmax < zmax]
+
+
+  def get_at (self, z):
+    """All items that contain z position, including zmin and excluding zmax
+    Args:
+        z (float): z position
+    Returns:
+        list: items with item.zmin <= z < item.zmax
+    """
+    stop = bisect.bisect_right(self.zmin_values, z)
+    return [self.items[n] for n in sorted(self.zmin_order[:stop]) if self.items[n].zmax > z]
+
 
 
 # -------------------- dielectrics ---------------------------
@@ -176,6 +267,9 @@ class dielectric_layers_list:
     """Initialize empty list
     """
     self.dielectrics = []      # list with dielectric objects
+    self._by_name = {}         # index: dielectric name -> dielectric, last one wins if name is used twice
+    self._by_material = {}     # index: material name -> list of dielectrics
+    self._z_index = None       # z_interval_index, built on first use
     
   def append (self, dielectric, materials_list ):
     """Append one dielectric to the list
@@ -186,6 +280,9 @@ class dielectric_layers_list:
     """
 
     self.dielectrics.append (dielectric)
+    self._by_name[dielectric.name] = dielectric
+    self._z_index = None
+    self._by_material.setdefault(dielectric.material, []).append(dielectric)
 
 
   def calculate_zpositions (self):
@@ -198,6 +295,7 @@ class dielectric_layers_list:
       dielectric.zmin = z
       dielectric.zmax = z + t
       z = dielectric.zmax
+    self._z_index = None
 
 
   def get_by_name (self, name_to_find):  
@@ -208,11 +306,40 @@ class dielectric_layers_list:
         dielectric_layer: dielectric with that name, otherwise None
     """
 
-    found = None
-    for dielectric in self.dielectrics:
-      if dielectric.name ==  name_to_find:
-        found = dielectric
-    return found    
+    return self._by_name.get(name_to_find)
+
+
+  def get_by_material (self, materialname):  
+    """find all dielectrics that use a material
+    Args:
+        materialname (string): name of material
+    Returns:
+        list of dielectric_layer: dielectrics with that material, in stackup order (top first), empty list if not found
+    """
+    return list(self._by_material.get(materialname, []))
+
+
+  def get_z_index (self):
+    """Index of dielectrics by z position, built on first use
+    Returns:
+        z_interval_index: index of dielectrics
+    """
+    if self._z_index is None:
+      self._z_index = z_interval_index(self.dielectrics)
+    return self._z_index
+
+
+  def get_at (self, z):
+    """find dielectric at z position, zmin is included and zmax is excluded
+    Args:
+        z (float): z position
+    Returns:
+        dielectric_layer: dielectric at that position, None if z is outside of all dielectrics
+    """
+    found = self.get_z_index().get_at(z)
+    if len(found) == 0:
+      return None
+    return found[0]
 
 
   def get_boundary_layers (self):
@@ -236,12 +363,8 @@ class dielectric_layers_list:
         metals_list (metal_layers_list): metals read from stackup
     """
     for dielectric in self.dielectrics:
-      enclosed = []
-      for metal in metals_list.metals:
-        # check if metal is enclosed in dielectric, excluding zmax exactly
-        if (metal.zmin >= dielectric.zmin) and (metal.zmax < dielectric.zmax):
-          enclosed.append(metal)          
-      dielectric.metals_inside = enclosed    
+      # metals enclosed in dielectric, excluding zmax exactly
+      dielectric.metals_inside = metals_list.get_z_index().get_inside(dielectric.zmin, dielectric.zmax)
 
 
 # -------------------- conductor layers (metal and via) ---------------------------
@@ -322,6 +445,9 @@ class metal_layers_list:
     self.metals = []      # list with conductor objects
     self.lowest = None    # metal with smallest zmin value
     self.orphan_layers = []  # list with layers that have no direct neighbor above or below
+    self._by_layernumber = {}  # index: layer number string -> list of metals in list order
+    self._by_name = {}         # index: layer name -> first metal with that name
+    self._z_index = None       # z_interval_index, built on first use
     
   def append (self, metal):
     """Append one metal layer (drawn layer)
@@ -329,6 +455,26 @@ class metal_layers_list:
         metal (metal_layer): metal layer to be added to list
     """
     self.metals.append (metal)
+    self._add_to_index (metal)
+    self._z_index = None
+
+
+  def _add_to_index (self, metal):
+    """Add metal layer to the lookup indexes, must be called in list order
+    Args:
+        metal (metal_layer): metal layer to be added
+    """
+    self._by_layernumber.setdefault(str(metal.layernum), []).append(metal)
+    self._by_name.setdefault(str(metal.name), metal)
+
+
+  def _build_index (self):
+    """Rebuild lookup indexes after the order of metals has changed
+    """
+    self._by_layernumber = {}
+    self._by_name = {}
+    for metal in self.metals:
+      self._add_to_index (metal)
 
   
   def getbylayernumber (self, number_to_find):
@@ -339,12 +485,10 @@ class metal_layers_list:
         metal_layer: metal layer with that layer number
     """
     
-    found = None
-    for metal in self.metals:
-      if metal.layernum == str(number_to_find):
-        found = metal
-        break 
-    return found  
+    found = self._by_layernumber.get(str(number_to_find))
+    if found is None:
+      return None
+    return found[0]
 
 
   def getallbylayernumber (self, number_to_find):
@@ -355,13 +499,10 @@ class metal_layers_list:
         list: list of metal_layer with that layer number, None if not found
     """
          
-    found = []
-    for metal in self.metals:
-      if metal.layernum == str(number_to_find):
-          found.append(metal)
-    if found==[]:
-      found = None
-    return found  
+    found = self._by_layernumber.get(str(number_to_find))
+    if found is None:
+      return None
+    return list(found)
 
 
   def getallplanarmetals (self):
@@ -385,12 +526,29 @@ class metal_layers_list:
         metal_layer: metal layer with that layer name
     """
 
-    found = None
-    for metal in self.metals:
-      if metal.name == str(name_to_find):
-        found = metal
-        break 
-    return found  
+    return self._by_name.get(str(name_to_find))
+
+
+  def get_z_index (self):
+    """Index of metals by z position, built on first use
+    Returns:
+        z_interval_index: index of metals, in order of self.metals
+    """
+    if self._z_index is None:
+      self._z_index = z_interval_index(self.metals)
+    return self._z_index
+
+
+  def getbyzrange (self, zmin, zmax, delta=1e-5):
+    """Find all metal layers with that z range, e.g. to find layers of a volume from its bounding box
+    Args:
+        zmin (float): lower z position
+        zmax (float): upper z position
+        delta (float, optional): what is considered equal. Defaults to 1e-5.
+    Returns:
+        list of metal_layer: metal layers with zmin and zmax equal to the given values
+    """
+    return self.get_z_index().get_by_zrange(zmin, zmax, delta)
 
 
   def getlayernumbers (self):
@@ -406,55 +564,126 @@ class metal_layers_list:
 
 
   def add_offset (self, offset): 
-    """Add offset in z position to all metal layers, used to add stackup height for final z position
+    """Add offset in z position to all metal layers, used to add stackup height for final z position.
+    Order of metals does not change, so lookup indexes remain valid.
     Args:
         offset (float): z offset in project units
     """
     for metal in self.metals:
       metal.zmin = metal.zmin + offset
       metal.zmax = metal.zmax + offset
+    self._z_index = None
 
 
   def sort_and_evaluate(self):
     """After reading all metals, sort them by position and detect the neighbors above/below
        This is set in each metal as .above and .below list
     """
-    # sort the list by zmin of each metal
+    # sort the list by zmin of each metal, indexes must follow the new order
     self.metals.sort(key=lambda metal: metal.zmin)
+    self._build_index()
     # metal with lowest zmin value
     self.lowest = self.metals[0]
 
     # delta for comparison, i.e. what is considered equal
     delta = 1e-5
 
-    # Build above/below relationships efficiently
+    # Build above/below relationships from z index, sorted by zmin and by zmax
+    self._z_index = None
+    z_index = self.get_z_index()
     for i, layer in enumerate(self.metals):
-        # Layers above: all layers with zmin >= current zmax
-        for other in self.metals[i+1:]:
-            if abs(other.zmin - layer.zmax) < delta:
-                layer.above.append(other)
-        # Layers below: all layers with zmax <= current zmin
-        for other in self.metals[:i]:
-            if abs(other.zmax - layer.zmin) < delta:
-                layer.below.append(other)
+        # Layers above: layers later in the list with zmin equal to current zmax
+        layer.above = [self.metals[n] for n in z_index.get_positions_by_zmin(layer.zmax, delta) if n > i]
+        # Layers below: layers earlier in the list with zmax equal to current zmin
+        layer.below = [self.metals[n] for n in z_index.get_positions_by_zmax(layer.zmin, delta) if n < i]
 
     # Identify orphan layers (no above or below)
     self.orphan_layers = [layer for layer in self.metals if not layer.above and not layer.below]
 
 
 
+# ----------- compiled stackup cache -----------
+
+STACKUP_CACHE_SUFFIX = '_stackup_cache.pkl'
+
+
+def get_stackup_cache_key (XML_filename):
+  """Create cache key for read_substrate(): hash over XML file content and version of this module
+
+  Args:
+      XML_filename (string): filename of XML technology file
+
+  Returns:
+      string: SHA-256 hash value as hex string
+  """
+  sha256 = hashlib.sha256(__version__.encode('utf-8'))
+  with open(XML_filename, 'rb') as f:
+    sha256.update(f.read())
+  return sha256.hexdigest()
+
+
+def save_stackup_cache (cache_filename, stackup):
+  """Write compiled stackup (materials, dielectrics, metals with z positions and relations) to pickle file
+
+  Args:
+      cache_filename (string): full filename of cache file
+      stackup (tuple): materials_list, dielectrics_list, metals_list
+  """
+  try:
+    os.makedirs(os.path.dirname(cache_filename), exist_ok=True)
+    # write to temporary file first, so that parallel runs never see incomplete cache files
+    temp_filename = cache_filename + '.' + str(os.getpid()) + '.tmp'
+    with open(temp_filename, 'wb') as f:
+      pickle.dump(stackup, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temp_filename, cache_filename)
+  except OSError as e:
+    print('[WARNING] Could not write stackup cache file ', cache_filename, ': ', e)
+
+
+def load_stackup_cache (cache_filename):
+  """Read compiled stackup from pickle file
+
+  Args:
+      cache_filename (string): full filename of cache file
+
+  Returns:
+      tuple: materials_list, dielectrics_list, metals_list, None if cache file does not exist or is invalid
+  """
+  if not os.path.isfile(cache_filename):
+    return None
+  try:
+    with open(cache_filename, 'rb') as f:
+      stackup = pickle.load(f)
+  except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ValueError) as e:
+    print('[WARNING] Ignoring invalid stackup cache file ', cache_filename, ': ', e)
+    return None
+  return stackup
+
+
 # ----------- parse substrate file, get materials from list created before -----------
 
-def read_substrate (XML_filename):
+def read_substrate (XML_filename, cache_path=None):
   """
   Read XML substrate and return materials_list, dielectrics_list, metals_list.
   Args:
       XML_filename (string): filename of XML technology file
+      cache_path (string, optional): Directory for compiled stackup, e.g. shared by all processes of a parameter sweep. 
+                                     The stackup is stored there and re-used if the XML file is unchanged. Defaults to None (no cache).
   """
 
   if os.path.isfile(XML_filename):  
     print('Reading XML stackup  file:', XML_filename)
 
+    # optional cache for compiled stackup, key is calculated from file content
+    cache_filename = None
+    if cache_path is not None:
+      cache_key = get_stackup_cache_key(XML_filename)
+      cache_filename = os.path.join(cache_path, os.path.splitext(os.path.basename(XML_filename))[0] + '_' + cache_key[:16] + STACKUP_CACHE_SUFFIX)
+      stackup = load_stackup_cache(cache_filename)
+      if stackup is not None:
+        print('Using cached stackup:', cache_filename)
+        return stackup
+
     # data source is *.subst XML file
     substrate_tree = xml.etree.ElementTree.parse(XML_filename)
     substrate_root = substrate_tree.getroot()
@@ -496,6 +725,9 @@ def read_substrate (XML_filename):
     # register metals with the enclosing dielectrics
     dielectrics_list.register_metals_inside (metals_list)
 
+    if cache_filename is not None:
+      save_stackup_cache(cache_filename, (materials_list, dielectrics_list, metals_list))
+
     return materials_list, dielectrics_list, metals_list
   
   else:
@@ -1,6 +1,6 @@
 # -*- coding: utf-8 -*-
 
-import os, tempfile, platform, sys, importlib
+import os, tempfile, platform, sys, importlib, hashlib
 
 __version__ = "1.0.0"
 
@@ -64,6 +64,21 @@ def create_sim_path (script_path, model_basename):
     return sim_path
 
 
+def calculate_sha256_of_file(filename):
+    """Calculate SHA-256 hash of file content
+    Args:
+        filename (string): full filename
+    Returns:
+        string: hash value as hex string
+    """
+    sha256_hash = hashlib.sha256()
+    with open(filename, 'rb') as f:
+        for byte_block in iter(lambda: f.read(65536), b""):
+            sha256_hash.update(byte_block)
+
+    return sha256_hash.hexdigest()
+
+
 def create_run_script (destination_path):
     """Create run script that can be used to start Palace simulation and then run postprocessing
     Args: